@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import time
 import urllib.parse
 import mysql.connector
 
@@ -49,6 +50,20 @@ if __name__ == "__main__":
     conn.close()
     print("Row count for 'traders':", row_count)
 
+    # time the well_performed filter (served by the traders secondary indexes)
+    conn = get_conn()
+    cursor = conn.cursor()
+    t0 = time.perf_counter()
+    cursor.execute("""
+        SELECT COUNT(*) FROM traders
+        WHERE gross_profit >= %s AND win_rate >= %s AND trades >= %s AND avg_trade_size >= %s
+    """, (500.0, 55.0, 20, 50.0))
+    matched = cursor.fetchone()[0]
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    cursor.close()
+    conn.close()
+    print(f"Filtered traders: {matched} in {elapsed_ms:.1f} ms")
+
     # # remove all the raws from traders
     # conn = get_conn()
     # cursor = conn.cursor()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# bench_extract.py
+# Offline extraction benchmark over the recorded page corpus in fixtures/html.
+#
+#   python bench_extract.py                      # all fixtures, every installed backend
+#   python bench_extract.py --iterations 50 --backends lxml
+#   python bench_extract.py --check              # compare against *.expected.json
+#   python bench_extract.py --update-expected    # re-baseline after an intended change
+#
+# Fixture files are named <kind>_<anything>.html; recorded pages (HTML_RECORD_DIR)
+# follow the same convention and can be dropped straight into the corpus.
+import os, sys, json, glob, time, argparse, statistics, tracemalloc
+import html_parsing
+from extractors import (extract_trending_rows, extract_top_trader_wallets,
+                        extract_wallet_metrics, extract_token_info)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+# kind -> html -> list of records
+EXTRACTORS = {
+    "trending": lambda html: extract_trending_rows(html, 10_000),
+    "top_traders": extract_top_trader_wallets,
+    "wallet": lambda html: [extract_wallet_metrics(html)],
+    "token": lambda html: [extract_token_info(html, "https://dexscreener.com/solana/fixture")],
+}
+
+def _available_backends():
+    out = ["html.parser"]
+    for name, module in (("lxml", "lxml"), ("html5lib", "html5lib")):
+        try:
+            __import__(module)
+            out.append(name)
+        except ImportError:
+            pass
+    return out
+
+def _load_corpus(kinds):
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        name = os.path.basename(path)[:-len(".html")]
+        kind = next((k for k in EXTRACTORS if name.startswith(k + "_") or name == k), None)
+        if kind is None or (kinds and kind not in kinds):
+            continue
+        with open(path, encoding="utf-8") as f:
+            corpus.append((name, kind, f.read()))
+    return corpus
+
+def _canonical(records) -> str:
+    # NaN-safe, order-preserving comparison
+    return json.dumps(records, sort_keys=True, default=str)
+
+def bench_one(kind: str, html: str, iterations: int):
+    fn = EXTRACTORS[kind]
+    fn(html)  # warm-up (regex compilation, imports)
+    latencies = []
+    records = None
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        records = fn(html)
+        latencies.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, latencies, peak
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--backends", nargs="*", default=None)
+    ap.add_argument("--kinds", nargs="*", default=None, choices=list(EXTRACTORS))
+    ap.add_argument("--check", action="store_true", help="fail if records differ from *.expected.json")
+    ap.add_argument("--update-expected", action="store_true")
+    args = ap.parse_args()
+
+    backends = args.backends or _available_backends()
+    corpus = _load_corpus(args.kinds)
+    if not corpus:
+        print(f"No fixtures found in {FIXTURE_DIR}")
+        return 1
+
+    failures = 0
+    print(f"{'page':<28} {'backend':<12} {'rows':>5} {'p50 ms':>9} {'p95 ms':>9} {'rows/s':>10} {'peak MiB':>9}")
+    for name, kind, html in corpus:
+        outputs = {}
+        for backend in backends:
+            html_parsing.HTML_PARSER = backend
+            records, lat, peak = bench_one(kind, html, args.iterations)
+            outputs[backend] = _canonical(records)
+            lat_sorted = sorted(lat)
+            p50 = statistics.median(lat_sorted)
+            p95 = lat_sorted[min(len(lat_sorted) - 1, int(0.95 * len(lat_sorted)))]
+            rows_per_s = len(records) * len(lat) / sum(lat) if sum(lat) else 0.0
+            print(f"{name:<28} {backend:<12} {len(records):>5} {p50 * 1000:>9.2f} {p95 * 1000:>9.2f} "
+                  f"{rows_per_s:>10.0f} {peak / 2**20:>9.2f}")
+
+        # every backend must extract the same records
+        if len(set(outputs.values())) > 1:
+            failures += 1
+            print(f"  MISMATCH between backends for {name}: {', '.join(outputs)}")
+
+        expected_path = os.path.join(FIXTURE_DIR, name + ".expected.json")
+        baseline = outputs[backends[0]]
+        if args.update_expected:
+            with open(expected_path, "w", encoding="utf-8") as f:
+                json.dump(json.loads(baseline), f, indent=1, sort_keys=True)
+                f.write("\n")
+        elif args.check and os.path.exists(expected_path):
+            with open(expected_path, encoding="utf-8") as f:
+                if _canonical(json.load(f)) != baseline:
+                    failures += 1
+                    print(f"  REGRESSION: {name} no longer matches {os.path.basename(expected_path)}")
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
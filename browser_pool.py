@@ -0,0 +1,218 @@
+# browser_pool.py
+# Keeps a small set of UC-mode Chrome sessions warm (challenge cookies already
+# cleared) and leases them to the scrapers instead of launching Chrome per call.
+import os, time, queue, atexit, threading
+from contextlib import ExitStack, contextmanager
+from typing import Optional
+from seleniumbase import SB
+import metrics
+from metrics import get_logger
+
+# ----------------------------
+# Settings
+# ----------------------------
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))        # recycle after N navigations
+MAX_AGE_SEC = int(os.getenv("BROWSER_MAX_AGE_SEC", "1800"))   # recycle after N seconds
+LEASE_TIMEOUT_SEC = int(os.getenv("BROWSER_LEASE_TIMEOUT_SEC", "600"))
+
+log = get_logger("pool")
+dprint = log.debug
+
+LAUNCH_SECONDS = metrics.histogram("browser_launch_seconds", "Chrome start plus warm-up navigation")
+LEASE_WAIT_SECONDS = metrics.histogram("browser_lease_wait_seconds", "Time to get a browser from the pool (includes launches)")
+RECYCLED = metrics.counter("browser_recycled_total", "Browsers closed for age, page count or failed health checks")
+
+
+class PooledBrowser:
+    """One long-lived SB session plus the bookkeeping used for recycling."""
+
+    def __init__(self, headless: bool):
+        self._stack = ExitStack()
+        self.sb = self._stack.enter_context(
+            SB(uc=True, test=True, locale_code="en", headless=headless)
+        )
+        self.created_at = time.monotonic()
+        self.pages = 0
+        self.cdp_active = False
+
+    def open(self, url: str):
+        # the first navigation switches the session into CDP mode, later ones reuse it
+        if not self.cdp_active:
+            self.sb.activate_cdp_mode(url)
+            self.cdp_active = True
+        else:
+            self.sb.open(url)
+        self.pages += 1
+
+    def ensure_cdp(self):
+        """Enter CDP mode without navigating (so CDP handlers can be attached first)."""
+        if not self.cdp_active:
+            self.sb.activate_cdp_mode("about:blank")
+            self.cdp_active = True
+
+    def solve_challenge(self, wait: float = 2):
+        self.sb.sleep(wait)
+        try: self.sb.uc_gui_click_captcha()
+        except Exception as e: dprint(f"Captcha not present/ignored: {e}")
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    def is_healthy(self) -> bool:
+        try:
+            self.sb.get_current_url()
+            return True
+        except Exception as e:
+            dprint(f"Health check failed: {e}")
+            return False
+
+    def close(self):
+        try:
+            self._stack.close()
+        except Exception as e:
+            log.error(f"Error closing browser: {e}")
+
+
+class BrowserPool:
+    """
+    Lease warm browsers to callers:
+
+        with pool.lease() as br:
+            br.open(url)
+            html = br.sb.get_page_source()
+
+    Browsers are created lazily up to `size`, health-checked on lease and
+    recycled after `max_pages` navigations or `max_age` seconds.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, warm_url: Optional[str] = None,
+                 headless: bool = True, max_pages: int = MAX_PAGES, max_age: int = MAX_AGE_SEC):
+        self.size = max(1, size)
+        self.warm_url = warm_url
+        self.headless = headless
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self._idle: "queue.Queue[PooledBrowser]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._total = 0
+        self._closed = False
+        atexit.register(self.close)
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    def _create(self) -> PooledBrowser:
+        t0 = time.monotonic()
+        br = PooledBrowser(self.headless)
+        if self.warm_url:
+            try:
+                br.open(self.warm_url)
+                br.solve_challenge()
+            except Exception as e:
+                dprint(f"Warm-up navigation failed: {e}")
+        LAUNCH_SECONDS.observe(time.monotonic() - t0)
+        dprint(f"Browser started in {time.monotonic() - t0:.1f}s")
+        return br
+
+    def _reserve_slot(self) -> bool:
+        with self._lock:
+            if self._total < self.size:
+                self._total += 1
+                return True
+            return False
+
+    def _discard(self, br: PooledBrowser):
+        RECYCLED.inc()
+        br.close()
+        with self._lock:
+            self._total -= 1
+
+    def _expired(self, br: PooledBrowser) -> bool:
+        return br.pages >= self.max_pages or br.age() >= self.max_age
+
+    def _replenish(self):
+        # start a replacement in the background so the next lease finds it warm
+        if self._closed or not self._reserve_slot():
+            return
+        def _run():
+            try:
+                self._idle.put(self._create())
+            except Exception as e:
+                log.error(f"Error starting replacement browser: {e}")
+                with self._lock:
+                    self._total -= 1
+        threading.Thread(target=_run, daemon=True).start()
+
+    def warm(self, n: Optional[int] = None):
+        """Start browsers up front so the first callers don't pay for Chrome startup."""
+        for _ in range(min(n or self.size, self.size)):
+            if not self._reserve_slot():
+                break
+            try:
+                self._idle.put(self._create())
+            except Exception as e:
+                log.error(f"Error warming browser: {e}")
+                with self._lock:
+                    self._total -= 1
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                br = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(br)
+
+    # ----------------------------
+    # Leasing
+    # ----------------------------
+    def _acquire(self, timeout: float) -> PooledBrowser:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                br = self._idle.get_nowait()
+            except queue.Empty:
+                if self._reserve_slot():
+                    try:
+                        return self._create()
+                    except Exception:
+                        with self._lock:
+                            self._total -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("No browser available in pool")
+                try:
+                    br = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError("No browser available in pool")
+
+            if self._expired(br) or not br.is_healthy():
+                dprint(f"Recycling browser (pages={br.pages}, age={br.age():.0f}s)")
+                self._discard(br)
+                continue
+            return br
+
+    def _release(self, br: PooledBrowser, failed: bool):
+        if self._closed:
+            self._discard(br)
+            return
+        if self._expired(br) or (failed and not br.is_healthy()):
+            dprint(f"Recycling browser (pages={br.pages}, age={br.age():.0f}s)")
+            self._discard(br)
+            self._replenish()
+            return
+        self._idle.put(br)
+
+    @contextmanager
+    def lease(self, timeout: float = LEASE_TIMEOUT_SEC):
+        with LEASE_WAIT_SECONDS.time():
+            br = self._acquire(timeout)
+        failed = True
+        try:
+            yield br
+            failed = False
+        finally:
+            self._release(br, failed)
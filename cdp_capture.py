@@ -0,0 +1,227 @@
+# cdp_capture.py
+# Optional network capture mode: listen to the page's own XHR/fetch responses and
+# WebSocket frames over the CDP session and decode the structured payloads into
+# the same records the DOM extractors produce. The DOM path stays the fallback.
+import os, json, time, base64, asyncio, threading
+from typing import Any, Callable, Dict, List, Optional
+import mycdp
+from extractors import parse_num
+from metrics import get_logger
+
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "dom")           # dom | network
+CAPTURE_TIMEOUT_SEC = float(os.getenv("CAPTURE_TIMEOUT_SEC", "15"))
+CAPTURE_POLL_SEC = 0.25
+
+log = get_logger("capture")
+dprint = log.debug
+
+def network_mode() -> bool:
+    return CAPTURE_MODE == "network"
+
+_CAPTURED_TYPES = {mycdp.network.ResourceType.XHR, mycdp.network.ResourceType.FETCH}
+
+
+class NetworkCapture:
+    """
+    Collect JSON payloads for responses/frames whose URL contains one of `url_patterns`.
+
+        with NetworkCapture(br, ["io.dexscreener.com"]) as cap:
+            br.open(url)
+            rows = cap.wait_for(decode_trending_pairs)
+    """
+
+    def __init__(self, br, url_patterns: List[str]):
+        self.br = br
+        self.url_patterns = url_patterns
+        self._pending: List[str] = []      # response request ids whose body is not fetched yet
+        self._ws_ids = set()               # websocket request ids for matching URLs
+        self._payloads: List[Any] = []
+
+    def _match(self, url: str) -> bool:
+        return any(p in url for p in self.url_patterns)
+
+    # handlers run on the CDP event loop; keep them tiny
+    def _on_response(self, evt):
+        if evt.type_ in _CAPTURED_TYPES and self._match(evt.response.url):
+            self._pending.append(evt.request_id)
+
+    def _on_ws_created(self, evt):
+        if self._match(evt.url):
+            self._ws_ids.add(evt.request_id)
+
+    def _on_ws_frame(self, evt):
+        if evt.request_id not in self._ws_ids:
+            return
+        data = evt.response.payload_data
+        if evt.response.opcode != 1:
+            try:
+                data = base64.b64decode(data).decode("utf-8")
+            except Exception:
+                return  # binary protocol we cannot decode
+        self._add(data)
+
+    def _add(self, text: str):
+        try:
+            self._payloads.append(json.loads(text))
+        except ValueError:
+            pass
+
+    def _handlers(self):
+        return (
+            (mycdp.network.ResponseReceived, self._on_response),
+            (mycdp.network.WebSocketCreated, self._on_ws_created),
+            (mycdp.network.WebSocketFrameReceived, self._on_ws_frame),
+        )
+
+    def __enter__(self):
+        # handlers must be in place before the navigation we want to observe
+        self.br.ensure_cdp()
+        page = self.br.sb.cdp.page
+        for evt, fn in self._handlers():
+            page.add_handler(evt, fn)
+        return self
+
+    def __exit__(self, *exc):
+        page = self.br.sb.cdp.page
+        for evt, fn in self._handlers():
+            try:
+                page.handlers[evt].remove(fn)
+            except (KeyError, ValueError):
+                pass
+        return False
+
+    def _pump(self, seconds: float):
+        """Let the CDP loop deliver events, then fetch bodies of matched responses."""
+        cdp = self.br.sb.cdp
+        loop = cdp.get_event_loop()
+        loop.run_until_complete(asyncio.sleep(seconds))
+        while self._pending:
+            request_id = self._pending.pop(0)
+            try:
+                body, is_b64 = loop.run_until_complete(
+                    cdp.page.send(mycdp.network.get_response_body(request_id))
+                )
+            except Exception as e:
+                dprint(f"Could not read response body: {e}")
+                continue
+            self._add(base64.b64decode(body).decode("utf-8", "replace") if is_b64 else body)
+
+    def wait_for(self, decoder: Callable[[Any], Any], timeout: float = CAPTURE_TIMEOUT_SEC):
+        """Poll captured payloads until `decoder` returns something truthy, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        seen = 0
+        while True:
+            self._pump(CAPTURE_POLL_SEC)
+            while seen < len(self._payloads):
+                result = decoder(self._payloads[seen])
+                seen += 1
+                if result:
+                    return result
+            if time.monotonic() >= deadline:
+                return None
+
+# ----------------------------
+# Decoders
+# ----------------------------
+def _fmt_usd(v) -> str:
+    """Render a number the way the dexscreener table does ("$1.2M")."""
+    if v is None:
+        return ""
+    v = float(v)
+    for div, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if abs(v) >= div:
+            return f"${v / div:.1f}{suffix}"
+    return f"${v:,.2f}"
+
+def _find(obj: Any, pred: Callable[[Any], bool]):
+    """Depth-first search for the first nested value matching pred."""
+    if pred(obj):
+        return obj
+    children = obj.values() if isinstance(obj, dict) else obj if isinstance(obj, list) else ()
+    for child in children:
+        found = _find(child, pred)
+        if found is not None:
+            return found
+    return None
+
+def _is_pairs(obj) -> bool:
+    return (isinstance(obj, list) and obj and isinstance(obj[0], dict)
+            and "pairAddress" in obj[0] and "baseToken" in obj[0])
+
+def decode_trending_pairs(payload: Any, n: int, chain: str = "sol", chain_id: str = "solana",
+                          link_base: str = "https://dexscreener.com/solana") -> List[Dict]:
+    """dexscreener pair list -> the records extract_trending_rows returns."""
+    pairs = _find(payload, _is_pairs)
+    if not pairs:
+        return []
+    out = []
+    for p in pairs:
+        if len(out) >= n:
+            break
+        if p.get("chainId", chain_id) != chain_id:
+            continue
+        contract = p["pairAddress"].lower()
+        base = p.get("baseToken") or {}
+        market_cap = p.get("marketCap", p.get("fdv"))
+        liquidity = (p.get("liquidity") or {}).get("usd")
+        volume = (p.get("volume") or {}).get("h24")
+        thumbnail = (p.get("info") or {}).get("imageUrl") or (
+            f"https://dd.dexscreener.com/ds-data/tokens/{chain_id}/{base['address']}.png" if base.get("address") else "")
+        mc_raw, liq_raw, vol_raw = _fmt_usd(market_cap), _fmt_usd(liquidity), _fmt_usd(volume)
+        out.append({
+            "chain": chain,
+            "contract": contract,
+            "name": base.get("name"),
+            "symbol": base.get("symbol"),
+            "rank": len(out) + 1,
+            "market_cap_raw": mc_raw,
+            "liquidity_raw": liq_raw,
+            "volume_raw": vol_raw,
+            "market_cap": parse_num(mc_raw) if market_cap is None else float(market_cap),
+            "liquidity": parse_num(liq_raw) if liquidity is None else float(liquidity),
+            "volume": parse_num(vol_raw) if volume is None else float(volume),
+            "link": f"{link_base}/{contract}",
+            "thumbnail": thumbnail,
+        })
+    return out
+
+# dexcheck wallet-analyzer field -> JSON keys seen for it
+WALLET_FIELD_ALIASES = {
+    "gross_profit": ("grossProfit", "gross_profit", "totalProfit"),
+    "realized_profit": ("realizedProfit", "realized_profit", "realizedPnl"),
+    "realized_profit_percent": ("realizedProfitPercent", "realizedRoi", "realizedPnlPercent"),
+    "unrealized_profit": ("unrealizedProfit", "unrealized_profit", "unrealizedPnl"),
+    "unrealized_profit_percent": ("unrealizedProfitPercent", "unrealizedRoi", "unrealizedPnlPercent"),
+    "win_rate": ("winRate", "win_rate"),
+    "wins": ("wins", "winCount", "totalWins"),
+    "losses": ("losses", "lossCount", "loses", "totalLosses"),
+    "trade_volume": ("tradingVolume", "tradeVolume", "totalVolume"),
+    "trades": ("trades", "totalTrades", "tradeCount"),
+    "avg_trade_size": ("avgTradeSize", "averageTradeSize"),
+}
+# realized/unrealized values are kept as strings, like the DOM parser does
+_STRING_FIELDS = {"realized_profit", "realized_profit_percent", "unrealized_profit", "unrealized_profit_percent"}
+
+def _wallet_field_hits(obj) -> int:
+    if not isinstance(obj, dict):
+        return 0
+    return sum(any(k in obj for k in keys) for keys in WALLET_FIELD_ALIASES.values())
+
+def decode_wallet_metrics(payload: Any) -> Optional[Dict]:
+    """dexcheck wallet stats payload -> the record extract_wallet_metrics returns."""
+    stats = _find(payload, lambda o: _wallet_field_hits(o) >= 4)
+    if stats is None:
+        return None
+    out = {"is_bot": bool(stats.get("isBot") or stats.get("is_bot") or
+                          str(stats.get("label") or "").lower().startswith("bot"))}
+    for field, keys in WALLET_FIELD_ALIASES.items():
+        value = next((stats[k] for k in keys if stats.get(k) is not None), None)
+        if value is not None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = None
+        if value is not None and field in _STRING_FIELDS:
+            value = f"{value:.2f}"
+        out[field] = value
+    return out
@@ -0,0 +1,62 @@
+# chains.py
+# Per-chain settings for the trending extractor: dexscreener slug, trending URL,
+# contract address pattern and the Redis namespace of the chain's window history.
+# TRENDING_CHAINS picks the chains one extractor process tracks.
+import os, re
+from typing import Dict, List
+from extractors import SOL_ADDR_RE
+
+TRENDING_CHAINS = os.getenv("TRENDING_CHAINS", "sol")     # comma-separated, e.g. sol,eth,base
+TRENDING_QUERY = "rankBy=trendingScoreH24&order=desc"
+
+def _evm_addr_re(chain_id: str):
+    # a pair address (40 hex) or a Uniswap v4 pool id (64 hex), never a prefix of a longer id
+    return re.compile(rf'/{chain_id}/(0x[0-9a-fA-F]{{40}}(?:[0-9a-fA-F]{{24}})?)(?![0-9a-fA-F])', re.IGNORECASE)
+
+# chain -> dexscreener chainId and the pattern of a pair link's contract
+CHAINS: Dict[str, Dict] = {
+    "sol":  {"chain_id": "solana",   "addr_re": SOL_ADDR_RE},
+    "eth":  {"chain_id": "ethereum", "addr_re": _evm_addr_re("ethereum")},
+    "base": {"chain_id": "base",     "addr_re": _evm_addr_re("base")},
+    "bsc":  {"chain_id": "bsc",      "addr_re": _evm_addr_re("bsc")},
+}
+
+
+class ChainConfig:
+    """
+        cfg = chain_config("eth")
+        cfg.trending_url    # TRENDING_URL_ETH or https://dexscreener.com/ethereum?rankBy=...
+        cfg.key_prefix      # trending:eth (sol keeps the original trending:* keys)
+    """
+
+    def __init__(self, chain: str, chain_id: str, addr_re, trending_url: str, key_prefix: str, window_size: int):
+        self.chain = chain
+        self.chain_id = chain_id
+        self.addr_re = addr_re
+        self.trending_url = trending_url
+        self.key_prefix = key_prefix
+        self.window_size = window_size
+        self.link_base = f"https://dexscreener.com/{chain_id}"
+
+    def __repr__(self):
+        return f"ChainConfig({self.chain}, {self.trending_url}, prefix={self.key_prefix})"
+
+
+def chain_config(chain: str) -> ChainConfig:
+    chain = chain.strip().lower()
+    if chain not in CHAINS:
+        raise ValueError(f"Unknown chain {chain!r} (known: {', '.join(CHAINS)})")
+    spec = CHAINS[chain]
+    default_url = f"https://dexscreener.com/{spec['chain_id']}?{TRENDING_QUERY}"
+    url = os.getenv(f"TRENDING_URL_{chain.upper()}")
+    if not url and chain == "sol":
+        url = os.getenv("TRENDING_URL")   # pre multi-chain setting
+    window_size = os.getenv(f"TRENDING_WINDOW_SIZE_{chain.upper()}") or os.getenv("TRENDING_WINDOW_SIZE", "100")
+    # sol stays on the un-namespaced keys the trader extractor and existing data use
+    prefix = "trending" if chain == "sol" else f"trending:{chain}"
+    return ChainConfig(chain, spec["chain_id"], spec["addr_re"], url or default_url, prefix, int(window_size))
+
+
+def enabled_chains(names: str = TRENDING_CHAINS) -> List[ChainConfig]:
+    chains = list(dict.fromkeys(c.strip().lower() for c in names.split(",") if c.strip()))
+    return [chain_config(c) for c in chains or ["sol"]]
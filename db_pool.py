@@ -0,0 +1,96 @@
+# db_pool.py
+# Thread-safe MySQL access for multi-threaded services: a lazily created
+# connection pool per process, a ping/reconnect health check on every checkout,
+# and a bounded wait when all connections are busy.
+import os, time, threading, urllib.parse
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+import mysql.connector
+from mysql.connector import pooling
+from metrics import get_logger
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))                  # per process, max 32
+DB_POOL_TIMEOUT_SEC = float(os.getenv("DB_POOL_TIMEOUT_SEC", "10"))  # wait for a free connection
+DB_PING_ATTEMPTS = 3
+
+log = get_logger("db")
+dprint = log.debug
+
+def connect_kwargs(db_url: str) -> Dict:
+    url = urllib.parse.urlparse(db_url)
+    return dict(
+        host=url.hostname,
+        port=url.port,
+        user=url.username,
+        password=url.password,
+        database=url.path.lstrip("/"),
+        ssl_disabled=False,
+        autocommit=True,
+    )
+
+
+class DBPool:
+    """
+        DB = DBPool(db_url, on_create=ensure_schema)
+        with DB.connection() as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute("SELECT ... FROM solana_tokens.tokens ...")
+
+    The pool is created on first use in each process, so forked server workers
+    never share sockets. `on_create(conn)` runs once per pool (schema setup).
+    """
+
+    def __init__(self, db_url: str, size: int = DB_POOL_SIZE, name: str = "api",
+                 on_create: Optional[Callable] = None):
+        self.kwargs = connect_kwargs(db_url)
+        self.size = max(1, min(size, pooling.CNX_POOL_MAXSIZE))
+        self.name = name
+        self.on_create = on_create
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> pooling.MySQLConnectionPool:
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    pool = pooling.MySQLConnectionPool(
+                        pool_name=f"{self.name}-{os.getpid()}", pool_size=self.size, **self.kwargs)
+                    self._pool, self._pid = pool, os.getpid()
+                    if self.on_create:
+                        conn = pool.get_connection()
+                        try:
+                            self.on_create(conn)
+                        finally:
+                            conn.close()
+        return self._pool
+
+    def _checkout(self):
+        pool = self._get_pool()
+        deadline = time.monotonic() + DB_POOL_TIMEOUT_SEC
+        while True:
+            try:
+                return pool.get_connection()
+            except pooling.PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            # the server or a proxy may have dropped an idle connection
+            conn.ping(reconnect=True, attempts=DB_PING_ATTEMPTS, delay=0.5)
+            yield conn
+        finally:
+            conn.close()   # back to the pool
+
+    @contextmanager
+    def cursor(self, **kwargs):
+        with self.connection() as conn:
+            cur = conn.cursor(**kwargs)
+            try:
+                yield cur
+            finally:
+                cur.close()
@@ -0,0 +1,157 @@
+# event_bus.py
+# Durable token_changed feed on a Redis Stream. Producers XADD with a capped
+# length; consumers read through a consumer group, ack what they finished and
+# reclaim entries left pending by a crashed or stuck peer.
+import os, json, socket, threading
+from typing import Dict, List, Optional, Tuple
+from metrics import get_logger
+
+EVENT_CHANNEL = "token_changed"                                     # legacy pub/sub channel
+EVENT_STREAM = os.getenv("EVENT_STREAM", "token_changed:stream")
+EVENT_STREAM_MAXLEN = int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))    # approximate cap
+EVENT_PUBSUB_COMPAT = os.getenv("EVENT_PUBSUB_COMPAT", "1") == "1"      # also PUBLISH for old listeners
+EVENT_CLAIM_IDLE_MS = int(os.getenv("EVENT_CLAIM_IDLE_MS", "600000"))   # reclaim entries pending this long
+EVENT_GROUP_START = os.getenv("EVENT_GROUP_START", "$")                  # where a new group starts: $ | 0
+EVENT_MAX_DELIVERIES = int(os.getenv("EVENT_MAX_DELIVERIES", "5"))      # then a redelivered entry is dropped (0 = no cap)
+
+log = get_logger("events")
+dprint = log.debug
+
+
+def publish(r, payload: Dict, stream: str = EVENT_STREAM, channel: str = EVENT_CHANNEL) -> str:
+    """Append one event to the stream (and the legacy channel); returns the entry id."""
+    data = json.dumps(payload)
+    pipe = r.pipeline(transaction=False)
+    pipe.xadd(stream, {"payload": data}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+    if EVENT_PUBSUB_COMPAT:
+        pipe.publish(channel, data)
+    return pipe.execute()[0]
+
+
+class EventConsumer:
+    """
+    One member of a consumer group:
+
+        consumer = EventConsumer(r, "trader")
+        while True:
+            for entry_id, event in consumer.read():
+                if handle(event):
+                    consumer.ack(entry_id)
+                else:
+                    consumer.release(entry_id)   # retried after claim_idle_ms
+
+    After a restart with the same consumer name, its own unacknowledged entries
+    are delivered again first, then the group continues from its last position.
+    An entry delivered more than `max_deliveries` times is acked and logged
+    instead of being handed out again.
+    """
+
+    def __init__(self, r, group: str, consumer: Optional[str] = None, stream: str = EVENT_STREAM,
+                 claim_idle_ms: int = EVENT_CLAIM_IDLE_MS, max_deliveries: int = EVENT_MAX_DELIVERIES):
+        self.r = r
+        self.group = group
+        self.consumer = consumer or os.getenv("EVENT_CONSUMER") or socket.gethostname()
+        self.stream = stream
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self._pending_cursor = "0"    # replay our own pending entries once on start
+        self._claim_cursor = "0-0"
+        self._inflight = set()        # delivered to us, not acked yet
+        self._lock = threading.Lock()
+        self._ensure_group()
+
+    def _ensure_group(self):
+        try:
+            self.r.xgroup_create(self.stream, self.group, id=EVENT_GROUP_START, mkstream=True)
+            dprint(f"Created consumer group {self.group} on {self.stream}")
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _decode(self, entries) -> List[Tuple[str, Dict]]:
+        out, dead = [], []
+        for entry_id, fields in entries or []:
+            if not fields:
+                dead.append(entry_id)  # trimmed away while pending
+                continue
+            try:
+                out.append((entry_id, json.loads(fields["payload"])))
+            except (KeyError, ValueError) as e:
+                dprint(f"Skipping malformed entry {entry_id}: {e}")
+                dead.append(entry_id)
+        # nothing can process these, don't let them sit in the pending list
+        self.ack(*dead)
+        with self._lock:
+            self._inflight.update(entry_id for entry_id, _ in out)
+        return out
+
+    def _drop_poison(self, entries):
+        """Ack (and log) redelivered entries that exceeded max_deliveries."""
+        if self.max_deliveries <= 0 or not entries:
+            return entries
+        ids = sorted((entry_id for entry_id, _ in entries), key=lambda i: tuple(map(int, i.split("-"))))
+        pending = self.r.xpending_range(self.stream, self.group, min=ids[0], max=ids[-1],
+                                        count=len(ids) * 2, consumername=self.consumer)
+        poison = {p["message_id"] for p in pending if p["times_delivered"] > self.max_deliveries}
+        if not poison:
+            return entries
+        for entry_id, fields in entries:
+            if entry_id in poison:
+                log.warning(f"Dropping {entry_id} after {self.max_deliveries} deliveries: {fields}")
+        self.ack(*poison)
+        return [e for e in entries if e[0] not in poison]
+
+    def _reclaim(self, count: int):
+        """Take over entries another consumer left pending for too long."""
+        if self.claim_idle_ms <= 0:
+            return []
+        res = self.r.xautoclaim(self.stream, self.group, self.consumer,
+                                min_idle_time=self.claim_idle_ms, start_id=self._claim_cursor, count=count)
+        self._claim_cursor = res[0] or "0-0"
+        # XAUTOCLAIM also matches our own slow entries; those are still being worked on
+        with self._lock:
+            claimed = [e for e in res[1] if e[0] not in self._inflight]
+        if claimed:
+            dprint(f"Reclaimed {len(claimed)} pending entries")
+        return claimed
+
+    def read(self, count: int = 10, block_ms: int = 5000) -> List[Tuple[str, Dict]]:
+        if self._pending_cursor:
+            resp = self.r.xreadgroup(self.group, self.consumer, {self.stream: self._pending_cursor}, count=count)
+            entries = resp[0][1] if resp else []
+            if entries:
+                self._pending_cursor = entries[-1][0]
+                return self._decode(self._drop_poison(entries))
+            self._pending_cursor = None
+
+        claimed = self._reclaim(count)
+        if claimed:
+            return self._decode(self._drop_poison(claimed))
+
+        resp = self.r.xreadgroup(self.group, self.consumer, {self.stream: ">"}, count=count, block=block_ms)
+        return self._decode(resp[0][1]) if resp else []
+
+    def ack(self, *entry_ids: str):
+        if entry_ids:
+            self.r.xack(self.stream, self.group, *entry_ids)
+            with self._lock:
+                self._inflight.difference_update(entry_ids)
+
+    def release(self, *entry_ids: str):
+        """Give up on entries without acking: they stay pending and are reclaimed after claim_idle_ms."""
+        with self._lock:
+            self._inflight.difference_update(entry_ids)
+
+    def lag(self) -> Dict:
+        """Pending count and undelivered backlog for this group."""
+        pending = self.r.xpending(self.stream, self.group)
+        info = next((g for g in self.r.xinfo_groups(self.stream) if g["name"] == self.group), {})
+        return {"pending": pending.get("pending", 0), "lag": info.get("lag")}
+
+    def close(self):
+        """Remove this consumer from the group (XGROUP DELCONSUMER); its pending entries are dropped."""
+        try:
+            pending = self.r.xgroup_delconsumer(self.stream, self.group, self.consumer)
+            dprint(f"Removed consumer {self.consumer} from {self.group} ({pending} pending dropped)")
+        except Exception as e:
+            log.warning(f"Could not remove consumer {self.consumer} from {self.group}: {e}")
@@ -0,0 +1,289 @@
+# extractors.py
+# Pure HTML -> record functions used by the scrapers. Nothing in here touches a
+# browser, Redis or MySQL, so the same code runs against recorded pages offline
+# (see fixtures/html and bench_extract.py).
+import os, re, math, time
+from typing import Callable, Dict, List, Optional
+from html_parsing import make_soup, TRENDING_ROWS, TOP_TRADER_LINKS, WALLET_STATS
+
+# set to a directory to save every page the scrapers parse (builds the fixture corpus)
+HTML_RECORD_DIR = os.getenv("HTML_RECORD_DIR")
+
+SOL_ADDR_RE = re.compile(r'/solana/([1-9A-HJ-NP-Za-km-z]{32,44})', re.IGNORECASE)
+
+# ----------------------------
+# Number helpers
+# ----------------------------
+def parse_num(s: str) -> float:
+    """Trending-table numbers ("$1.2M", "45%"); NaN when unparseable."""
+    if not s: return math.nan
+    s = s.replace(",", "").strip()
+    mult = 1.0
+    if s.endswith("%"): s = s[:-1]
+    if s.startswith("$"): s = s[1:]
+    if s and s[-1] in "KkMmBb":
+        m = {"K":1e3,"M":1e6,"B":1e9}[s[-1].upper()]
+        mult = m; s = s[:-1]
+    try:
+        return float(s) * mult
+    except:
+        return math.nan
+
+def parse_number(value_str):
+    """Wallet-analyzer numbers; None when unparseable."""
+    if not value_str:
+        return None
+
+    value_str = value_str.replace(",", "").strip().replace("$", "").replace("%", "")
+    multiplier = 1.0
+
+    if value_str.endswith("K"):
+        multiplier = 1_000.0
+        value_str = value_str[:-1]
+    elif value_str.endswith("M"):
+        multiplier = 1_000_000.0
+        value_str = value_str[:-1]
+    elif value_str.endswith("B"):
+        multiplier = 1_000_000_000.0
+        value_str = value_str[:-1]
+
+    try:
+        return float(value_str) * multiplier
+    except ValueError:
+        return None
+
+def record_html(kind: str, html: str):
+    """Save a page into HTML_RECORD_DIR as <kind>_<timestamp>.html (no-op when unset)."""
+    if not HTML_RECORD_DIR:
+        return
+    os.makedirs(HTML_RECORD_DIR, exist_ok=True)
+    path = os.path.join(HTML_RECORD_DIR, f"{kind}_{time.time_ns()}.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+# ----------------------------
+# dexscreener trending table
+# ----------------------------
+def extract_trending_rows(html: str, n: int, chain: str = "sol", addr_re=SOL_ADDR_RE,
+                          link_base: str = "https://dexscreener.com/solana") -> List[Dict]:
+    # only the table rows are parsed into a tree
+    soup = make_soup(html, TRENDING_ROWS)
+    rows = soup.select("a.ds-dex-table-row")
+    out = []
+    rank = 1
+    for row in rows:
+
+        # check the range has been exceeded, if yes -> break
+        if rank > n:
+            break
+
+        href = row.get("href","")
+
+        # extract the token address from the href or img src
+        m = addr_re.search(href)
+        if not m:
+            img = row.select_one("img.ds-dex-table-row-token-icon-img")
+            if img and img.get("src"):
+                m = addr_re.search(img["src"])
+        if not m: continue
+
+        # extract the token information
+        contract = m.group(1)
+        contract = contract.lower()
+        name = (row.select_one(".ds-dex-table-row-base-token-name-text") or {}).get_text(strip=True) if row.select_one(".ds-dex-table-row-base-token-name-text") else None
+        symbol = (row.select_one(".ds-dex-table-row-base-token-symbol") or {}).get_text(strip=True) if row.select_one(".ds-dex-table-row-base-token-symbol") else None
+        mc_node = row.select_one(".ds-dex-table-row-col-market-cap")
+        liq_node = row.select_one(".ds-dex-table-row-col-liquidity")
+        vol_node = row.select_one(".ds-dex-table-row-col-volume")
+        market_cap = mc_node.text.strip() if mc_node else ""
+        liquidity  = liq_node.text.strip() if liq_node else ""
+        volume     = vol_node.text.strip() if vol_node else ""
+        thumbnail  = (row.select_one("img.ds-dex-table-row-token-icon-img") or {}).get("src","") if row.select_one("img.ds-dex-table-row-token-icon-img") else ""
+
+        out.append({
+            "chain": chain,
+            "contract": contract,
+            "name": name,
+            "symbol": symbol,
+            "rank": rank,
+            "market_cap_raw": market_cap,
+            "liquidity_raw": liquidity,
+            "volume_raw": volume,
+            "market_cap": parse_num(market_cap),
+            "liquidity": parse_num(liquidity),
+            "volume": parse_num(volume),
+            "link": f"{link_base}/{contract}",
+            "thumbnail": thumbnail,
+        })
+        rank += 1
+
+    return out
+
+# ----------------------------
+# dexscreener "Top Traders" tab
+# ----------------------------
+def extract_top_trader_wallets(html: str) -> List[str]:
+    """Wallet addresses from the Top Traders links, in page order."""
+    soup = make_soup(html, TOP_TRADER_LINKS)
+    wallets = []
+    # find all the a tag with class 'custom-1hhf88o'
+    for tag in soup.find_all('a', class_='custom-1hhf88o'):
+        if tag and 'href' in tag.attrs:
+            # https://solscan.io/account/8Hw9X9UwBso7Sp2CFnEEeUGW8pGDj9wghc78ccWFZWpU get the last part of the href
+            wallets.append(tag['href'].split('/')[-1])
+    return wallets
+
+# ----------------------------
+# dexcheck wallet analyzer
+# ----------------------------
+def extract_wallet_metrics(html: str) -> Dict:
+    # only the stats-card text nodes (h3/p/span) are parsed into a tree
+    soup = make_soup(html, WALLET_STATS)
+
+    gross_profit_value = realized_profit_value = realized_profit_percent = None
+    unrealized_profit_value = unrealized_profit_percent = win_rate_value = None
+    win_value = loss_value = trade_volume_value = trades_value = avg_trade_size_value = None
+
+    # --- Check if the wallet is bot? if bot the name is like this "Bot (gasTzr94Pmp4Gf8vknQnqxeYxdgwFjbgdJa4msYRpnB)"
+    # begin with Bot
+    bot_tag = soup.find('span', string=re.compile(r"^Bot\s*\(", flags=re.I))
+
+    # --- Gross Profit ---
+    gross_profit = soup.find('h3', string=re.compile(r"Gross Profit", flags=re.I))
+    if gross_profit:
+        gross_profit_value = parse_number(gross_profit.find_next('p').text.strip())
+
+    # -- Realized Profit ---
+    realized_profit = soup.find('p', string=re.compile(r"Realized", flags=re.I))
+    if realized_profit:
+        realized_profit_str = realized_profit.find_next('p').text.strip()
+        realized_profit_value = realized_profit_str.split(" ")[0].replace(",", "").replace("$", "")
+        realized_profit_percent = realized_profit_str.split(" ")[1].replace("(", "").replace(")", "").replace("%", "")
+
+    # --- Unrealized Profit ---
+    unrealized_profit = soup.find('p', string=re.compile(r"Unrealized", flags=re.I))
+    if unrealized_profit:
+        unrealized_profit_str = unrealized_profit.find_next('p').text.strip()
+        unrealized_profit_value = unrealized_profit_str.split(" ")[0].replace(",", "").replace("$", "")
+        unrealized_profit_percent = unrealized_profit_str.split(" ")[1].replace("(", "").replace(")", "").replace("%", "")
+
+    # --- Win Rate ---
+    win_rate = soup.find('h3', string=re.compile(r"Win Rate", flags=re.I))
+    if win_rate:
+        win_rate_value = parse_number(win_rate.find_next('p').text.strip())
+
+    # --- Wins and Losses ---
+    win_count = soup.find('p', string=re.compile(r"Win", flags=re.I))
+    if win_count:
+        win_value = parse_number(win_count.find_next('p').text.strip())
+    loss_count = soup.find('p', string=re.compile(r"Lose", flags=re.I))
+    if loss_count:
+        loss_value = parse_number(loss_count.find_next('p').text.strip())
+
+    # --- Trade Volume, Trades, Avg Trade Size ---
+    # Based on known layout order and heading structure
+    trade_volume = soup.find('p', string=re.compile(r"Trading Volume", flags=re.I))
+    if trade_volume:
+        trade_volume_value = parse_number(trade_volume.find_next('p').text.strip())
+
+    trades = soup.find('p', string=re.compile(r"Trades", flags=re.I))
+    if trades:
+        trades_value = parse_number(trades.find_next('p').text.strip())
+
+    avg_trade_size = soup.find('p', string=re.compile(r"Avg. Trade Size", flags=re.I))
+    if avg_trade_size:
+        avg_trade_size_value = parse_number(avg_trade_size.find_next('p').text.strip())
+
+    return {
+        "is_bot": bot_tag is not None,
+        "gross_profit": gross_profit_value,
+        "realized_profit": realized_profit_value,
+        "realized_profit_percent": realized_profit_percent,
+        "unrealized_profit": unrealized_profit_value,
+        "unrealized_profit_percent": unrealized_profit_percent,
+        "win_rate": win_rate_value,
+        "wins": win_value,
+        "losses": loss_value,
+        "trade_volume": trade_volume_value,
+        "trades": trades_value,
+        "avg_trade_size": avg_trade_size_value,
+    }
+
+# ----------------------------
+# dexscreener token page
+# ----------------------------
+def extract_token_info(html: str, addr: str, log: Optional[Callable[[str], None]] = None) -> Dict:
+    """Name, symbol and logo from a token page; `log` receives the candidate debug lines."""
+    log = log or (lambda msg: None)
+    soup = make_soup(html)
+
+    # Find the logo image URL
+    logo_img = soup.find('img', src=re.compile(r'cdn\.dexscreener\.com/cms/images/'))
+    logo_url = logo_img['src'] if logo_img else None
+
+    # Extract token name (prefer header structure)
+    # 1) Look inside <header> that has (itself or descendants) class 'chakra-stack'
+    #    and contains h2.chakra-heading.
+    header_candidates = []
+    for hdr in soup.find_all('header'):
+        has_stack = ('chakra-stack' in (hdr.get('class') or [])) or bool(hdr.find(class_='chakra-stack'))
+        if not has_stack:
+            continue
+        h2 = hdr.find('h2', class_='chakra-heading')
+        if not h2:
+            continue
+        span = h2.find('span')
+        text = (span.get_text(strip=True) if span else h2.get_text(strip=True))
+        if text and 1 <= len(text) <= 120:
+            header_candidates.append((hdr, h2, text))
+
+    if not header_candidates:
+        log("Name pattern debug (header): No <header> with chakra-stack and h2.chakra-heading found")
+    else:
+        log(f"Name pattern debug (header): Found {len(header_candidates)} candidates")
+        for idx, (_, _, txt) in enumerate(header_candidates):
+            log(f"  [H{idx}] {txt}")
+
+    # Extract token symbol (prefer element structure)
+    # 1) Look inside <div> that has (itself or descendants) class 'chakra-stack'
+    #    and contains h2.chakra-heading.
+    #  h2 contains span with symbol text.
+    # Only divs that are ancestors of an h2.chakra-heading can qualify, so collect
+    # those first and keep the document-order scan cheap for every other div.
+    h2_ancestors = set()
+    for h2 in soup.find_all('h2', class_='chakra-heading'):
+        for parent in h2.parents:
+            if parent.name != 'div':
+                continue
+            if id(parent) in h2_ancestors:
+                break  # the rest of this chain was added by an earlier h2
+            h2_ancestors.add(id(parent))
+    symbol_candidates = []
+    for div in soup.find_all('div'):
+        if id(div) not in h2_ancestors:
+            continue
+        has_stack = ('chakra-stack' in (div.get('class') or [])) or bool(div.find(class_='chakra-stack'))
+        if not has_stack:
+            continue
+        h2 = div.find('h2', class_='chakra-heading')
+        if not h2:
+            continue
+        span = h2.find('span')
+        text = (span.get_text(strip=True) if span else h2.get_text(strip=True))
+        if text and 1 <= len(text) <= 20:
+            symbol_candidates.append((div, h2, text))
+
+    if not symbol_candidates:
+        log("Symbol pattern debug (div): No <div> with chakra-stack and h2.chakra-heading found")
+    else:
+        log(f"Symbol pattern debug (div): Found {len(symbol_candidates)} candidates")
+        for idx, (_, _, txt) in enumerate(symbol_candidates):
+            log(f"  [S{idx}] {txt}")
+
+    return {
+        # store the contract address in simple letter form
+        'contract': addr.split('/')[-1].lower(),
+        'name': header_candidates[0][2] if header_candidates else None,
+        'symbol': symbol_candidates[0][2] if symbol_candidates else None,
+        'logo_url': logo_url
+    }
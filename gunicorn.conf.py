@@ -0,0 +1,13 @@
+# gunicorn.conf.py
+# Read by gunicorn from the working directory:
+#   gunicorn -w 4 --threads 8 --timeout 180 -b 0.0.0.0:5000 'token-info-api:app'
+# Starts per-worker background work as soon as a worker has loaded the app
+# (with or without --preload), instead of on its first request.
+import sys
+
+
+def post_worker_init(worker):
+    api = sys.modules.get("token-info-api")
+    if api is not None and api.PREFETCHER is not None:
+        # one stream consumer per worker, reading ADDED events from boot on
+        api.PREFETCHER.start()
@@ -0,0 +1,36 @@
+# html_parsing.py
+# Shared BeautifulSoup construction: pluggable parser backend and SoupStrainers
+# that restrict the tree to the regions each scraper actually reads.
+import os, re
+from typing import Optional
+from bs4 import BeautifulSoup, SoupStrainer
+
+def _default_backend() -> str:
+    try:
+        import lxml  # noqa: F401  (optional, much faster than html.parser)
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+# "lxml" | "html.parser" | "html5lib"; falls back to html.parser when lxml is missing
+HTML_PARSER = os.getenv("HTML_PARSER") or _default_backend()
+
+def has_class(css_class: str):
+    # while parsing, strainers see the raw (unsplit) class attribute, so a plain
+    # class_="x" would not match class="x y"
+    return re.compile(r"(?:^|\s)" + re.escape(css_class) + r"(?:\s|$)")
+
+# ----------------------------
+# Parse regions
+# ----------------------------
+# dexscreener trending table rows
+TRENDING_ROWS = SoupStrainer("a", class_=has_class("ds-dex-table-row"))
+# dexscreener "Top Traders" wallet links
+TOP_TRADER_LINKS = SoupStrainer("a", class_=has_class("custom-1hhf88o"))
+# dexcheck wallet-analyzer stats cards: labels/values are h3/p, the bot marker is a span
+WALLET_STATS = SoupStrainer(["h3", "p", "span"])
+
+
+def make_soup(html: str, parse_only: Optional[SoupStrainer] = None, backend: Optional[str] = None) -> BeautifulSoup:
+    """Parse html with the configured backend, optionally keeping only `parse_only` regions."""
+    return BeautifulSoup(html, backend or HTML_PARSER, parse_only=parse_only)
@@ -0,0 +1,358 @@
+# metrics.py
+# Shared instrumentation for the extractors and the API: Prometheus-style
+# counters, gauges and latency histograms with labels, a /metrics endpoint per
+# service (METRICS_PORT), and the leveled logger behind every module's dprint.
+import os, sys, time, bisect, threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))          # 0 = no HTTP endpoint
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()         # DEBUG | INFO | WARNING | ERROR | OFF
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+RATE_WINDOW_SEC = 60                                        # *_per_minute gauges look back this far
+
+# ----------------------------
+# Logging
+# ----------------------------
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "OFF": 100}
+_level = LEVELS.get(LOG_LEVEL, 10)
+_write_lock = threading.Lock()
+
+
+class Logger:
+    """
+        log = get_logger("pool")
+        log.debug("Browser started")      # 140211::pool:: Browser started
+        log.error("Health check failed")  # 140211::pool:: ERROR Health check failed
+
+    A call below LOG_LEVEL returns after one integer compare; lines are written
+    whole, so threads do not interleave them.
+    """
+
+    def __init__(self, area: Optional[str] = None):
+        self.area = area
+
+    def _emit(self, level: int, msg: str):
+        if level < _level:
+            return
+        tag = "" if level < LEVELS["WARNING"] else ("ERROR " if level >= LEVELS["ERROR"] else "WARNING ")
+        area = f"{self.area}:: " if self.area else ""
+        line = f"{threading.get_ident()}::{area}{tag}{msg}\n"
+        with _write_lock:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    def enabled(self, level: str = "DEBUG") -> bool:
+        return LEVELS[level] >= _level
+
+    def debug(self, msg: str):
+        if _level <= 10:
+            self._emit(10, msg)
+
+    def info(self, msg: str):
+        self._emit(20, msg)
+
+    def warning(self, msg: str):
+        self._emit(30, msg)
+
+    def error(self, msg: str):
+        self._emit(40, msg)
+
+
+def get_logger(area: Optional[str] = None) -> Logger:
+    return Logger(area)
+
+def set_level(level: str):
+    global _level
+    _level = LEVELS[level.upper()]
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    parts = [f'{n}="{esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+
+
+class Counter(_Metric):
+    """Monotonic count per label set; rate=True also exports {name}_per_minute."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), rate: bool = False):
+        super().__init__(name, help, labels)
+        self.rate = rate
+        self._values: Dict[Tuple, float] = defaultdict(float)
+        self._recent: Dict[Tuple, deque] = defaultdict(deque)   # (second, n) within the rate window
+
+    def inc(self, n: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += n
+            if self.rate:
+                now = int(time.monotonic())
+                recent = self._recent[key]
+                if recent and recent[-1][0] == now:
+                    recent[-1][1] += n
+                else:
+                    recent.append([now, n])
+                while recent and recent[0][0] <= now - RATE_WINDOW_SEC:
+                    recent.popleft()
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def per_minute(self, **labels) -> float:
+        cutoff = int(time.monotonic()) - RATE_WINDOW_SEC
+        with self._lock:
+            recent = self._recent.get(self._key(labels), ())
+            return sum(n for ts, n in recent if ts > cutoff) * 60 / RATE_WINDOW_SEC
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted(self._values.items())
+        out = [self.header()] + [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}\n" for k, v in items]
+        if self.rate:
+            base = self.name[:-len("_total")] if self.name.endswith("_total") else self.name
+            out.append(f"# HELP {base}_per_minute {self.help} (last {RATE_WINDOW_SEC}s, per minute)\n"
+                       f"# TYPE {base}_per_minute gauge\n")
+            for k, _ in items:
+                rate = self.per_minute(**dict(zip(self.labels, k)))
+                out.append(f"{base}_per_minute{_fmt_labels(self.labels, k)} {_fmt_value(rate)}\n")
+        return "".join(out)
+
+    def drain(self) -> Dict:
+        with self._lock:
+            values, self._values = dict(self._values), defaultdict(float)
+            self._recent.clear()
+        return values
+
+    def merge(self, values: Dict):
+        for key, n in values.items():
+            self.inc(n, **dict(zip(self.labels, key)))
+
+
+class Gauge(_Metric):
+    """Current value per label set, either set() or read from `fn` at render time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, v: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = v
+
+    def render(self) -> str:
+        if self.fn is not None:
+            try:
+                items = [((), self.fn())]
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + "".join(f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}\n" for k, v in items)
+
+    def drain(self) -> Dict:
+        return {}
+
+    def merge(self, values: Dict):
+        pass
+
+
+class Histogram(_Metric):
+    """
+        h = histogram("stage_seconds", "Time per stage", ("stage",))
+        with h.time(stage="mysql"):
+            ...
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._data: Dict[Tuple, list] = {}     # key -> [bucket counts..., sum, count]
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            d = self._data.get(key)
+            if d is None:
+                d = self._data[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                d[i] += 1
+            d[-2] += seconds
+            d[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            d = self._data.get(self._key(labels))
+            return d[-1] if d else 0
+
+    def render(self) -> str:
+        with self._lock:
+            items = sorted((k, list(d)) for k, d in self._data.items())
+        out = [self.header()]
+        for key, d in items:
+            cum = 0
+            for le, n in zip(self.buckets, d):
+                cum += n
+                le = 'le="%s"' % _fmt_value(le)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {cum}\n")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {d[-1]}\n")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(d[-2])}\n")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {d[-1]}\n")
+        return "".join(out)
+
+    def drain(self) -> Dict:
+        with self._lock:
+            data, self._data = self._data, {}
+        return data
+
+    def merge(self, data: Dict):
+        with self._lock:
+            for key, src in data.items():
+                d = self._data.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+                for i, v in enumerate(src):
+                    d[i] += v
+
+
+class Registry:
+    """Metrics by name; asking for an existing name returns the same metric."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(m, cls):
+                raise ValueError(f"{name} is already registered as a {m.kind}")
+            return m
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = (), rate: bool = False) -> Counter:
+        return self._get(Counter, name, help, labels, rate=rate)
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = (), fn: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._get(Gauge, name, help, labels, fn=fn)
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "".join(m.render() for m in metrics)
+
+    def drain(self) -> Dict[str, Dict]:
+        """Take (and zero) everything recorded so far, e.g. to ship it from a worker process."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: d for m in metrics for d in [m.drain()] if d}
+
+    def merge(self, drained: Dict[str, Dict]):
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, data in drained.items():
+            if name in metrics:
+                metrics[name].merge(data)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+# shared by every service: where the time of a cycle / token / request goes
+STAGE_SECONDS = histogram("stage_seconds", "Time spent in a pipeline stage", ("stage",))
+STAGE_ERRORS = counter("stage_errors_total", "Pipeline stages that raised", ("stage",))
+
+@contextmanager
+def stage(name: str):
+    """Time a block as `name` in stage_seconds; exceptions also count in stage_errors_total."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=name)
+
+# ----------------------------
+# HTTP endpoint
+# ----------------------------
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass    # scrapes every few seconds would flood the logs
+
+
+def serve(port: int = METRICS_PORT, registry: Registry = REGISTRY) -> Optional[ThreadingHTTPServer]:
+    """Expose GET /metrics on `port` from a daemon thread (no-op when port is 0)."""
+    if not port:
+        return None
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    get_logger("metrics").info(f"Serving /metrics on :{port}")
+    return server
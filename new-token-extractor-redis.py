@@ -1,30 +1,42 @@
 # trending_extractor_redis.py
-import os, json, time, random, threading, datetime as dt, math
+import os, json, time, random, hashlib, threading, datetime as dt, math
 import pytz, re
 import redis  # pip install redis
 from typing import List, Dict, Tuple
-from seleniumbase import SB
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from extractors import extract_trending_rows, record_html
+from cdp_capture import NetworkCapture, decode_trending_pairs, network_mode
+from page_waits import PageWaiter
+from browser_pool import BrowserPool, POOL_SIZE as BROWSER_POOL_SIZE
+from snapshot_store import SnapshotStore
+from scheduler import FixedRateScheduler, FairExecutor
+from chains import ChainConfig, enabled_chains
+from token_store import ensure_schema
 import mysql.connector
 import urllib.parse
+import metrics
+from metrics import get_logger
+from profiling import Profiler, install_signal
 
 # ----------------------------
 # Settings
 # ----------------------------
 REDIS_URL  = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-TRENDING_URL = os.getenv(
-    "TRENDING_URL",
-    "https://dexscreener.com/solana?rankBy=trendingScoreH24&order=desc"
-)
-CHAIN = "sol"
-WINDOW_SIZE = int(os.getenv("TRENDING_WINDOW_SIZE", "100"))
+# tracked chains (TRENDING_CHAINS), each with its own URL, address pattern and trending:* namespace
+CHAINS = enabled_chains()
+# XHR/WebSocket hosts carrying the trending pairs (CAPTURE_MODE=network)
+TRENDING_CAPTURE_PATTERNS = ["io.dexscreener.com", "api.dexscreener.com"]
 INTERVAL_SEC = int(os.getenv("TRENDING_INTERVAL_SECONDS", "60"))
+JITTER_SEC = float(os.getenv("TRENDING_JITTER_SECONDS", "5"))
+PAGE_SIZE = int(os.getenv("TRENDING_PAGE_SIZE", "100"))           # rows dexscreener shows per page
+MAX_PARALLEL_PAGES = int(os.getenv("TRENDING_MAX_PARALLEL_PAGES", "5"))
 RANK_MOVE_THRESHOLD = int(os.getenv("RANK_MOVE_THRESHOLD", "999999"))  # start with only add/remove
 TZ = pytz.timezone(os.getenv("TZ", "Asia/Colombo"))
 HEADLESS = True
-DEBUG = True
 
 DB_WRITE = True  # Set to False to disable DB writes (for testing)
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "500"))  # rows per executemany
+DB_DIRTY_ONLY = os.getenv("DB_DIRTY_ONLY", "1") == "1"   # upsert only rows whose values changed
 
 db_url = os.getenv("DB_URL")  # Set this in your .env file
 
@@ -44,235 +56,365 @@ sqldb = mysql.connector.connect(
 
 sql_cursor = sqldb.cursor()
 
-def dprint(msg: str):
-    if DEBUG:
-        t = threading.current_thread()
-        print(f"{t.ident}::{msg}")
+log = get_logger()
+dprint = log.debug
+
+ROWS_WRITTEN = metrics.counter("rows_written_total", "Rows upserted into MySQL", ("table",), rate=True)
+EVENTS_PUBLISHED = metrics.counter("events_published_total", "token_changed events published", ("chain", "change_type"))
+WINDOWS = metrics.counter("windows_total", "Scraped windows by outcome", ("chain", "result"))
+WINDOW_ROWS = metrics.gauge("window_rows", "Rows in the last scraped window", ("chain",))
+
+# PROFILE_CYCLES=N / SIGUSR1: profile the next N cycles (any chain), persist work included
+PROFILER = Profiler("trending")
 
 r = redis.from_url(REDIS_URL, decode_responses=True)
 
+# every page of every chain is scraped on one shared set of browsers, round-robin across chains
+PAGES = sum(max(1, math.ceil(cfg.window_size / PAGE_SIZE)) for cfg in CHAINS)
+PAGE_WORKERS = max(1, min(PAGES, MAX_PARALLEL_PAGES))
+
+# warm Chrome sessions, reused across polls
+BROWSER_POOL = BrowserPool(size=max(BROWSER_POOL_SIZE, PAGE_WORKERS), warm_url=CHAINS[0].trending_url, headless=HEADLESS)
+PAGE_EXECUTOR = FairExecutor(PAGE_WORKERS, name="page")
+
 # redis keys
-K_LATEST_VER = "trending:latest_version"          # string int
-K_WINDOW_VER = "trending:window:{ver}"            # json array
-K_WINDOW_META= "trending:window:{ver}:meta"       # hash (as_of)
+K_LAST_WRITTEN = "tokens:last_written"            # hash chain:contract -> digest of the values last upserted
 
 # ----------------------------
-# Helpers
+# Scraping
 # ----------------------------
-def parse_num(s: str) -> float:
-    if not s: return math.nan
-    s = s.replace(",", "").strip()
-    mult = 1.0
-    if s.endswith("%"): s = s[:-1]
-    if s.startswith("$"): s = s[1:]
-    if s and s[-1] in "KkMmBb":
-        m = {"K":1e3,"M":1e6,"B":1e9}[s[-1].upper()]
-        mult = m; s = s[:-1]
+def page_url(cfg: ChainConfig, page: int) -> str:
+    """The chain's trending URL for page N (dexscreener pages are /<chain>/page-N, same query)."""
+    if page <= 1:
+        return cfg.trending_url
+    parts = urllib.parse.urlsplit(cfg.trending_url)
+    return urllib.parse.urlunsplit(parts._replace(path=f"{parts.path.rstrip('/')}/page-{page}"))
+
+def _scrape_trending_network(br, cfg: ChainConfig, url: str, n: int) -> List[Dict]:
+    """Decode the page's own pair payloads instead of rendering the table."""
+    with NetworkCapture(br, TRENDING_CAPTURE_PATTERNS) as cap:
+        br.open(url)
+        rows = cap.wait_for(lambda payload: decode_trending_pairs(
+            payload, n, chain=cfg.chain, chain_id=cfg.chain_id, link_base=cfg.link_base))
+    return rows or []
+
+def scrape_trending_page(cfg: ChainConfig, url: str, n: int) -> List[Dict]:
+    # pages run on the page executor's threads, so they join the cycle's profile themselves
+    with PROFILER.profile(count=False):
+        return _scrape_trending_page(cfg, url, n)
+
+def _scrape_trending_page(cfg: ChainConfig, url: str, n: int) -> List[Dict]:
+    with BROWSER_POOL.lease() as br:
+        sb = br.sb
+        waiter = PageWaiter(sb, url, kind="trending")
+        dprint(f"Navigate: {url}")
+        if network_mode():
+            with waiter.stage("capture"):
+                rows = _scrape_trending_network(br, cfg, url, n)
+            if rows:
+                dprint(f"Captured {len(rows)} rows from network payloads ({waiter.summary()})")
+                return rows
+            dprint("No decodable pair payloads captured, falling back to DOM")
+        else:
+            with waiter.stage("navigate"):
+                br.open(url)
+        if not waiter.wait("table", selectors=['img.ds-dex-table-row-token-icon-img'], max_timeout=50):
+            raise TimeoutError(f"Trending table not ready ({waiter.summary()})")
+        with waiter.stage("page_source"):
+            html = sb.get_page_source()
+        dprint(waiter.summary())
+
+    record_html("trending", html)
+    with waiter.stage("parse"):
+        return extract_trending_rows(html, n, chain=cfg.chain, addr_re=cfg.addr_re, link_base=cfg.link_base)
+
+def _scrape_page_retry(cfg: ChainConfig, page: int) -> List[Dict]:
     try:
-        return float(s) * mult
-    except:
-        return math.nan
-
-SOL_ADDR_RE = re.compile(r'/solana/([1-9A-HJ-NP-Za-km-z]{32,44})', re.IGNORECASE)
-
-def scrape_trending_topN(n: int) -> List[Dict]:
-    with SB(uc=True, test=True, locale_code="en", headless=HEADLESS) as sb:
-        dprint(f"Navigate: {TRENDING_URL}")
-        sb.activate_cdp_mode(TRENDING_URL)
-        sb.sleep(4)
-        try: sb.uc_gui_click_captcha()
-        except Exception as e: dprint(f"Captcha not present/ignored: {e}")
-        sb.wait_for_element_visible('img.ds-dex-table-row-token-icon-img', timeout=50)
-        html = sb.get_page_source()
-
-    soup = BeautifulSoup(html, "html.parser")
-    rows = soup.select("a.ds-dex-table-row")
-    out = []
-    rank = 1
-    for row in rows:
-
-        # check the range has been exceeded, if yes -> break
-        if rank > n: 
+        return scrape_trending_page(cfg, page_url(cfg, page), PAGE_SIZE)
+    except Exception as e:
+        dprint(f"[{cfg.chain}] Page {page} failed ({e}), retrying once")
+        return scrape_trending_page(cfg, page_url(cfg, page), PAGE_SIZE)
+
+def scrape_trending_topN(cfg: ChainConfig, n: int) -> List[Dict]:
+    """
+    Top n rows of one chain. Pages run on the shared PAGE_EXECUTOR (one pooled
+    browser each, round-robin with the other chains' pages); deep windows are
+    merged in page order, without contracts that moved across a page boundary
+    between loads, and re-ranked.
+    """
+    pages = max(1, math.ceil(n / PAGE_SIZE))
+    if pages == 1:
+        return PAGE_EXECUTOR.submit(cfg.chain, scrape_trending_page, cfg, cfg.trending_url, n).result()
+
+    t0 = time.perf_counter()
+    # a missing page would turn into spurious REMOVED/ADDED events, so any failure fails the cycle
+    futures = [PAGE_EXECUTOR.submit(cfg.chain, _scrape_page_retry, cfg, page) for page in range(1, pages + 1)]
+    results = [f.result() for f in futures]
+    merged, seen = [], set()
+    for page, rows in enumerate(results, start=1):
+        if len(rows) < PAGE_SIZE and page < pages:
+            dprint(f"[{cfg.chain}] Page {page} returned only {len(rows)} rows")
+        for row in rows:
+            if row["contract"] in seen:
+                continue
+            seen.add(row["contract"])
+            row = dict(row, rank=len(merged) + 1)
+            merged.append(row)
+            if len(merged) >= n:
+                break
+        if len(merged) >= n:
             break
-        
-        href = row.get("href","")
-
-        # extract the SOL address from the href or img src
-        m = SOL_ADDR_RE.search(href)
-        if not m:
-            img = row.select_one("img.ds-dex-table-row-token-icon-img")
-            if img and img.get("src"):
-                m = SOL_ADDR_RE.search(img["src"])
-        if not m: continue
-
-        # extract the token information
-        contract = m.group(1)
-        contract = contract.lower()
-        name = (row.select_one(".ds-dex-table-row-base-token-name-text") or {}).get_text(strip=True) if row.select_one(".ds-dex-table-row-base-token-name-text") else None
-        symbol = (row.select_one(".ds-dex-table-row-base-token-symbol") or {}).get_text(strip=True) if row.select_one(".ds-dex-table-row-base-token-symbol") else None
-        mc_node = row.select_one(".ds-dex-table-row-col-market-cap")
-        liq_node = row.select_one(".ds-dex-table-row-col-liquidity")
-        vol_node = row.select_one(".ds-dex-table-row-col-volume") 
-        market_cap = mc_node.text.strip() if mc_node else ""
-        liquidity  = liq_node.text.strip() if liq_node else ""
-        volume     = vol_node.text.strip() if vol_node else ""
-        thumbnail  = (row.select_one("img.ds-dex-table-row-token-icon-img") or {}).get("src","") if row.select_one("img.ds-dex-table-row-token-icon-img") else ""
-
-        # store in DB
-        if DB_WRITE:
-            try:
-                sql_cursor.execute("""
-                    INSERT INTO tokens (contract, chain, name, symbol, market_cap, liquidity, volume, thumbnail)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        name=VALUES(name),
-                        symbol=VALUES(symbol),
-                        market_cap=VALUES(market_cap),
-                        liquidity=VALUES(liquidity),
-                        volume=VALUES(volume),
-                        thumbnail=VALUES(thumbnail)
-                """, (
-                    contract,
-                    CHAIN,
-                    name,
-                    symbol,
-                    parse_num(market_cap),
-                    parse_num(liquidity),
-                    parse_num(volume),
-                    thumbnail
-                ))
-                sqldb.commit()
-            except mysql.connector.Error as err:
-                dprint(f"Error inserting/updating token {contract}: {err}")
-
-        # append to output
-        out.append({
-            "chain": CHAIN,
-            "contract": contract,
-            "name": name,
-            "symbol": symbol,
-            "rank": rank,
-            "market_cap_raw": market_cap,
-            "liquidity_raw": liquidity,
-            "volume_raw": volume,
-            "market_cap": parse_num(market_cap),
-            "liquidity": parse_num(liquidity),
-            "volume": parse_num(volume),
-            "link": f"https://dexscreener.com/solana/{contract}",
-        })
-        rank += 1
-
-    # dprint(f"Scraped {len(out)} tokens")
-    return out
-
-def compute_diff(prev: List[Dict], curr: List[Dict], rank_move_threshold: int):
-    prev_idx = {(t["chain"], t["contract"]): t["rank"] for t in prev}
-    curr_idx = {(t["chain"], t["contract"]): t["rank"] for t in curr}
-    prev_keys, curr_keys = set(prev_idx.keys()), set(curr_idx.keys())
-
-    added = [(k, curr_idx[k]) for k in (curr_keys - prev_keys)]
-    removed = [(k, prev_idx[k]) for k in (prev_keys - curr_keys)]
-    moved = []
-    for k in (prev_keys & curr_keys):
-        dr = prev_idx[k] - curr_idx[k]
-        if abs(dr) >= rank_move_threshold:
-            moved.append((k, prev_idx[k], curr_idx[k]))
-    return added, removed, moved
-
-def publish_token_change(change_type, chain, contract, old_rank, new_rank, window_version, as_of):
-    payload = {
-        "event_id": f"{chain}:{contract}:{window_version}:{change_type}:{old_rank}:{new_rank}",
-        "as_of": as_of.isoformat(),
-        "change_type": change_type,
-        "chain": chain,
-        "contract": contract,
-        "old_rank": old_rank,
-        "new_rank": new_rank,
-        "window_version": window_version
-    }
-    r.publish("token_changed", json.dumps(payload))
-    dprint(f"Published token_changed: {payload}")
-
-def get_latest_version() -> int:
-    v = r.get(K_LATEST_VER)
-    return int(v) if v else 0
-
-def save_window(curr: List[Dict], as_of: dt.datetime) -> int:
+    if len(merged) < n:
+        dprint(f"[{cfg.chain}] Window has {len(merged)} of {n} requested rows (end of list or short pages)")
+    dprint(f"[{cfg.chain}] Scraped {pages} pages with {PAGE_WORKERS} shared browsers in {time.perf_counter() - t0:.1f}s")
+    return merged
+
+UPSERT_TOKENS_SQL = """
+    INSERT INTO tokens (contract, chain, name, symbol, market_cap, liquidity, volume, thumbnail)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        name=VALUES(name),
+        symbol=VALUES(symbol),
+        market_cap=VALUES(market_cap),
+        liquidity=VALUES(liquidity),
+        volume=VALUES(volume),
+        thumbnail=VALUES(thumbnail)
+"""
+
+# digests of the rows last written, mirrored in K_LAST_WRITTEN so a restart stays incremental;
+# both only hold each chain's current window (see _prune_digests)
+_last_written: Dict[str, str] = {}
+_legacy_digests_pruned = False
+
+def _row_digest(params: Tuple) -> str:
+    return hashlib.blake2b(repr(params).encode(), digest_size=8).hexdigest()
+
+def _digest_key(params: Tuple) -> str:
+    # rows are keyed by (chain, contract): the same EVM address can trend on two chains
+    return f"{params[1]}:{params[0]}"
+
+def _dirty(params: List[Tuple]) -> List[Tuple]:
+    """The rows whose values differ from what was last upserted for their (chain, contract)."""
+    unknown = [_digest_key(p) for p in params if _digest_key(p) not in _last_written]
+    if unknown:
+        for key, digest in zip(unknown, r.hmget(K_LAST_WRITTEN, unknown)):
+            if digest:
+                _last_written[key] = digest
+    return [p for p in params if _last_written.get(_digest_key(p)) != _row_digest(p)]
+
+def _prune_digests(chain: str, window_keys: set):
     """
-    Atomically bump the version and store the latest snapshot in Redis.
+    Forget the digests of this chain's tokens that left the window, so neither
+    the dict nor the Redis hash grows with every contract ever seen. A token
+    that comes back is simply written once more.
+    """
+    global _legacy_digests_pruned
+    prefix = f"{chain}:"
+    for key in [k for k in _last_written if k.startswith(prefix) and k not in window_keys]:
+        del _last_written[key]
+    # the first pass also drops fields from before digests were keyed by chain
+    match = f"{prefix}*" if _legacy_digests_pruned else None
+    stale = [field for field, _ in r.hscan_iter(K_LAST_WRITTEN, match=match, count=1000)
+             if ":" not in field or (field.startswith(prefix) and field not in window_keys)]
+    if stale:
+        r.hdel(K_LAST_WRITTEN, *stale)
+        dprint(f"[{chain}] Dropped {len(stale)} digests of tokens no longer in the window")
+    _legacy_digests_pruned = True
+
+def persist_tokens(rows: List[Dict], batch_size: int = DB_BATCH_SIZE) -> int:
+    """
+    Upsert a scraped window into MySQL in one transaction, skipping rows that
+    have not changed since they were last written (DB_DIRTY_ONLY).
+    mysql-connector rewrites each executemany() batch into a single multi-row INSERT.
+    """
+    if not DB_WRITE or not rows:
+        return 0
+    # NaN is not a valid MySQL DOUBLE; store NULL instead
+    nan_to_none = lambda v: None if isinstance(v, float) and math.isnan(v) else v
+    params = [(
+        t["contract"], t["chain"], t["name"], t["symbol"],
+        nan_to_none(t["market_cap"]), nan_to_none(t["liquidity"]), nan_to_none(t["volume"]),
+        t["thumbnail"],
+    ) for t in rows]
+    scraped = len(params)
+    if DB_DIRTY_ONLY:
+        for chain in {p[1] for p in params}:
+            _prune_digests(chain, {_digest_key(p) for p in params if p[1] == chain})
+        params = _dirty(params)
+        if not params:
+            dprint(f"DB: all {scraped} tokens unchanged, nothing to upsert")
+            return 0
+
+    t0 = time.perf_counter()
+    try:
+        with metrics.stage("mysql"):
+            for i in range(0, len(params), max(1, batch_size)):
+                sql_cursor.executemany(UPSERT_TOKENS_SQL, params[i:i + batch_size])
+            sqldb.commit()
+    except mysql.connector.Error as err:
+        sqldb.rollback()
+        log.error(f"Error upserting {len(params)} tokens: {err}")
+        return 0
+    if DB_DIRTY_ONLY:
+        digests = {_digest_key(p): _row_digest(p) for p in params}
+        _last_written.update(digests)
+        r.hset(K_LAST_WRITTEN, mapping=digests)
+    ROWS_WRITTEN.inc(len(params), table="tokens")
+    dprint(f"DB: upserted {len(params)} of {scraped} tokens in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return len(params)
+
+# windows of all chains are persisted/published here while the next cycles scrape;
+# one worker serializes the shared MySQL connection and keeps each chain's commits in order
+PERSIST_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist")
+
+
+class ChainTracker:
+    """
+    Scrape -> persist -> commit loop of one chain:
+
+        tracker = ChainTracker(chain_config("eth"))
+        FixedRateScheduler(INTERVAL_SEC, name="trending:eth").run(tracker.run_cycle)
+
+    The window history lives under the chain's key prefix; browsers, the page
+    executor, the persist worker and the MySQL connection are shared.
     """
-    pipe = r.pipeline()
-    # next version
-    pipe.incr(K_LATEST_VER)
-    new_ver = pipe.execute()[0]
-
-    pipe = r.pipeline()
-    pipe.set(K_WINDOW_VER.format(ver=new_ver), json.dumps(curr))
-    pipe.hset(K_WINDOW_META.format(ver=new_ver), mapping={"as_of": as_of.isoformat()})
-    pipe.execute()
-    return new_ver
-
-def load_window(version: int) -> List[Dict]:
-    if version <= 0: return []
-    raw = r.get(K_WINDOW_VER.format(ver=version))
-    return json.loads(raw) if raw else []
-
-def run_once():
-    as_of = dt.datetime.now(TZ).replace(microsecond=0)
-    dprint("Scraping trending window...")
-    curr = scrape_trending_topN(WINDOW_SIZE)
-
-    dprint("Saving window to Redis...")
-    new_ver = save_window(curr, as_of)
-    prev_ver = new_ver - 1
-    prev = load_window(prev_ver)
-
-    added, removed, moved = compute_diff(prev, curr, RANK_MOVE_THRESHOLD)
-    dprint(f"Diff v{prev_ver}→v{new_ver}: +{len(added)} / -{len(removed)} / moved:{len(moved)}")
-
-    for (k, new_rank) in added:
-        chain, contract = k
-        publish_token_change("ADDED", chain, contract, None, new_rank, new_ver, as_of)
-    for (k, old_rank) in removed:
-        chain, contract = k
-        publish_token_change("REMOVED", chain, contract, old_rank, None, new_ver, as_of)
-    for (k, old_rank, new_rank) in moved:
-        chain, contract = k
-        publish_token_change("MOVED", chain, contract, old_rank, new_rank, new_ver, as_of)
+
+    def __init__(self, cfg: ChainConfig):
+        self.cfg = cfg
+        self.chain = cfg.chain
+        # window history: keyframes + deltas under {prefix}:window:{ver}
+        self.snapshots = SnapshotStore(r, prefix=cfg.key_prefix)
+        self._pending = None
+
+    def log(self, msg: str):
+        dprint(f"[{self.chain}] {msg}")
+
+    def get_latest_version(self) -> int:
+        return self.snapshots.latest_version()
+
+    def commit_window(self, curr: List[Dict], as_of: dt.datetime) -> Tuple[int, List[Dict]]:
+        """
+        Bump the version, store the snapshot (as a delta or keyframe), diff it against
+        the previous window and publish the token_changed events: one Redis round trip.
+        events is None when the window is identical to the latest version (nothing written).
+        """
+        t0 = time.perf_counter()
+        with metrics.stage("redis_commit"):
+            new_ver, events = self.snapshots.commit(curr, as_of, chain=self.chain, rank_move_threshold=RANK_MOVE_THRESHOLD)
+        WINDOWS.inc(chain=self.chain, result="unchanged" if events is None else "committed")
+        if events is None:
+            self.log(f"Window unchanged since v{new_ver}, skipped ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+        else:
+            self.log(f"Committed window v{new_ver} in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        return new_ver, events
+
+    def load_window(self, version: int) -> List[Dict]:
+        return self.snapshots.load(version)
+
+    def scrape_window(self) -> Tuple[dt.datetime, List[Dict]]:
+        as_of = dt.datetime.now(TZ).replace(microsecond=0)
+        self.log("Scraping trending window...")
+        t0 = time.perf_counter()
+        with metrics.stage("scrape"):
+            curr = scrape_trending_topN(self.cfg, self.cfg.window_size)
+        WINDOW_ROWS.set(len(curr), chain=self.chain)
+        self.log(f"Scraped {len(curr)} tokens in {time.perf_counter() - t0:.1f}s")
+        return as_of, curr
+
+    def finish_window(self, as_of: dt.datetime, curr: List[Dict]):
+        """Persist a scraped window to MySQL, then commit it to Redis and publish the changes."""
+        t0 = time.perf_counter()
+        persist_tokens(curr)
+
+        self.log("Saving window to Redis...")
+        new_ver, events = self.commit_window(curr, as_of)
+        if events is None:
+            return
+
+        counts = {"ADDED": 0, "REMOVED": 0, "MOVED": 0}
+        for payload in events:
+            counts[payload["change_type"]] += 1
+            EVENTS_PUBLISHED.inc(chain=self.chain, change_type=payload["change_type"])
+            dprint(f"Published token_changed: {payload}")
+        self.log(f"Diff v{new_ver - 1}→v{new_ver}: +{counts['ADDED']} / -{counts['REMOVED']} / moved:{counts['MOVED']}")
+        self.log(f"Persist + publish took {time.perf_counter() - t0:.1f}s")
+
+    def run_once(self):
+        with PROFILER.profile(), metrics.stage("cycle"):
+            self.finish_window(*self.scrape_window())
+
+    def _finish_logged(self, as_of: dt.datetime, curr: List[Dict]):
+        try:
+            with PROFILER.profile(count=False), metrics.stage("persist"):
+                self.finish_window(as_of, curr)
+        except Exception as e:
+            log.error(f"[{self.chain}] Persisting window from {as_of.isoformat()}: {e}")
+
+    def run_cycle(self):
+        """Scrape in the caller's thread and hand the window to the persist worker."""
+        with PROFILER.profile():
+            self._run_cycle()
+
+    def _run_cycle(self):
+        as_of, curr = self.scrape_window()
+        if self._pending is not None and not self._pending.done():
+            # never queue more than one window of this chain behind the worker
+            t0 = time.perf_counter()
+            with metrics.stage("persist_backlog"):
+                self._pending.result()
+            self.log(f"Waited {time.perf_counter() - t0:.1f}s for the previous cycle to finish persisting")
+        self._pending = PERSIST_EXECUTOR.submit(self._finish_logged, as_of, curr)
+
+
+TRACKERS = [ChainTracker(cfg) for cfg in CHAINS]
+
+def run_chains(trackers: List[ChainTracker] = TRACKERS):
+    """
+    One fixed-rate loop per chain, started interval/len(chains) apart so their
+    scrapes interleave on the shared browsers instead of all landing together.
+    """
+    stagger = INTERVAL_SEC / len(trackers)
+    schedulers, threads = [], []
+    for i, tracker in enumerate(trackers):
+        sched = FixedRateScheduler(INTERVAL_SEC, jitter=JITTER_SEC, name=f"trending:{tracker.chain}")
+        t = threading.Thread(target=sched.run, args=(tracker.run_cycle,), kwargs={"offset": i * stagger},
+                             name=f"trending-{tracker.chain}", daemon=True)
+        schedulers.append(sched)
+        threads.append(t)
+        t.start()
+    try:
+        for t in threads:
+            while t.is_alive():
+                t.join(1)
+    finally:
+        for sched in schedulers:
+            sched.stop()
+        for t in threads:
+            t.join()
 
 if __name__ == "__main__":
-    dprint("Trending extractor (Redis only) started.")
-    # Ensure version key exists
-    if not r.exists(K_LATEST_VER):
-        r.set(K_LATEST_VER, 0)
+    dprint(f"Trending extractor (Redis only) started for {', '.join(cfg.chain for cfg in CHAINS)}.")
+    # Ensure version keys exist
+    for tracker in TRACKERS:
+        r.setnx(tracker.snapshots.k_latest, 0)
 
     # initialize the SQL connection
     try:
-        sql_cursor.execute("CREATE DATABASE IF NOT EXISTS solana_tokens")
+        # creates solana_tokens.tokens, widening contract for 66-character pool ids
+        ensure_schema(sqldb)
         sql_cursor.execute("USE solana_tokens")
-        sql_cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tokens (
-                contract VARCHAR(64) PRIMARY KEY,
-                chain VARCHAR(10),
-                name VARCHAR(255),
-                symbol VARCHAR(50),
-                market_cap DOUBLE,
-                liquidity DOUBLE,
-                volume DOUBLE,
-                thumbnail VARCHAR(255)
-            )
-                    """)
         sqldb.commit()
     except mysql.connector.Error as err:
-        dprint(f"Error initializing MySQL: {err}")
+        log.error(f"Error initializing MySQL: {err}")
         exit(1)
 
-    while True:
-        try:
-            run_once()
-        except Exception as e:
-            dprint(f"ERROR: {e}")
-        # # small jitter
-        # sleep_s = INTERVAL_SEC + random.randint(-5, 5)
-        # time.sleep(60*5)
-        time.sleep(5)
+    metrics.serve()   # METRICS_PORT
+    install_signal()  # kill -USR1 <pid> profiles the next PROFILE_SIGNAL_CYCLES cycles
+    BROWSER_POOL.warm()
+
+    # fixed-rate cycles per chain (TRENDING_INTERVAL_SECONDS ± TRENDING_JITTER_SECONDS), scrape overlapping persistence
+    try:
+        run_chains()
+    finally:
+        PERSIST_EXECUTOR.shutdown(wait=True)
+        PAGE_EXECUTOR.shutdown()
@@ -0,0 +1,175 @@
+# page_waits.py
+# Readiness-driven waits: poll for "challenge cleared", DOM selectors and network
+# idle instead of fixed sleeps, inside a per-page latency budget, with timeouts
+# adapted to the recent p95 load time of each host.
+import os, time, threading
+from contextlib import contextmanager
+from collections import defaultdict, deque
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+import metrics
+from metrics import get_logger
+
+PAGE_BUDGET_SEC = float(os.getenv("PAGE_BUDGET_SEC", "120"))          # whole page, all stages
+WAIT_POLL_SEC = float(os.getenv("WAIT_POLL_SEC", "0.25"))
+WAIT_MIN_TIMEOUT_SEC = float(os.getenv("WAIT_MIN_TIMEOUT_SEC", "5"))
+WAIT_P95_FACTOR = float(os.getenv("WAIT_P95_FACTOR", "2.5"))          # adaptive timeout = p95 * factor
+WAIT_SAMPLES = int(os.getenv("WAIT_SAMPLES", "50"))                   # recent loads kept per host
+WAIT_MIN_SAMPLES = 5                                                  # until then use the caller's max
+NETWORK_IDLE_MS = int(os.getenv("NETWORK_IDLE_MS", "500"))
+CHALLENGE_CLICK_AFTER_SEC = 2.0    # let Cloudflare auto-solve before clicking
+CHALLENGE_CLICK_EVERY_SEC = 5.0
+
+log = get_logger("wait")
+dprint = log.debug
+
+# per page kind (trending, token, wallet, ...): how long each stage of a load takes
+STAGE_SECONDS = metrics.histogram("page_stage_seconds", "Browser page stages: navigate, challenge, waits, capture, parse",
+                                  ("page", "stage"))
+WAIT_TIMEOUTS = metrics.counter("page_wait_timeouts_total", "Readiness waits that timed out", ("page", "stage"))
+PAGES = metrics.counter("pages_total", "Pages loaded in a browser", ("page",), rate=True)
+
+# single-line JS expressions (CDP mode strips the leading "return ")
+JS_CHALLENGE = (
+    "return /just a moment|attention required/i.test(document.title) || "
+    "!!document.querySelector('iframe[src*=\"challenges.cloudflare.com\"], #challenge-form, #cf-challenge-running')"
+)
+JS_NETWORK_IDLE = (
+    "return document.readyState === 'complete' && "
+    "(performance.now() - Math.max(0, ...performance.getEntriesByType('resource').map(e => e.responseEnd))) >= {idle_ms}"
+)
+
+
+class LatencyTracker:
+    """Recent ready-times per host/stage; turns their p95 into the next timeout."""
+
+    def __init__(self, samples: int = WAIT_SAMPLES):
+        self._samples = defaultdict(lambda: deque(maxlen=samples))
+        self._lock = threading.Lock()
+
+    def record(self, host: str, seconds: float):
+        with self._lock:
+            self._samples[host].append(seconds)
+
+    def p95(self, host: str) -> Optional[float]:
+        with self._lock:
+            data = sorted(self._samples[host])
+        if len(data) < WAIT_MIN_SAMPLES:
+            return None
+        return data[min(len(data) - 1, int(0.95 * len(data)))]
+
+    def timeout(self, host: str, max_timeout: float) -> float:
+        p95 = self.p95(host)
+        if p95 is None:
+            return max_timeout
+        return min(max_timeout, max(WAIT_MIN_TIMEOUT_SEC, p95 * WAIT_P95_FACTOR))
+
+TRACKER = LatencyTracker()
+
+
+class PageWaiter:
+    """
+    Waits for one page. Every wait() counts against the same budget, and the
+    time spent in each stage is kept in `timings` (seconds by stage name) and
+    exported as page_stage_seconds{page=kind}.
+
+        waiter = PageWaiter(br.sb, url, kind="trending")
+        with waiter.stage("navigate"):
+            br.open(url)
+        if not waiter.wait("table", selectors=["a.ds-dex-table-row"], max_timeout=50):
+            raise TimeoutError(...)
+        dprint(waiter.summary())
+    """
+
+    def __init__(self, sb, url: str, budget: float = PAGE_BUDGET_SEC, tracker: LatencyTracker = TRACKER,
+                 kind: Optional[str] = None):
+        self.sb = sb
+        self.host = urlparse(url).netloc or url
+        self.kind = kind or self.host
+        PAGES.inc(page=self.kind)
+        self.tracker = tracker
+        self.started = time.monotonic()
+        self.deadline = self.started + budget
+        self.timings: Dict[str, float] = {}
+        self._last_click = 0.0
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def _eval(self, js: str) -> bool:
+        try:
+            return bool(self.sb.execute_script(js))
+        except Exception:
+            return False
+
+    def _challenge_cleared(self, since: float) -> bool:
+        if not self._eval(JS_CHALLENGE):
+            return True
+        now = time.monotonic()
+        if now - since >= CHALLENGE_CLICK_AFTER_SEC and now - self._last_click >= CHALLENGE_CLICK_EVERY_SEC:
+            self._last_click = now
+            try: self.sb.uc_gui_click_captcha()
+            except Exception as e: dprint(f"Captcha click failed: {e}")
+        return False
+
+    def _visible(self, selectors: Iterable[str]) -> bool:
+        for sel in selectors:
+            try:
+                if not self.sb.is_element_visible(sel):
+                    return False
+            except Exception:
+                return False
+        return True
+
+    def wait(self, stage: str, selectors: Iterable[str] = (), network_idle: bool = False,
+             challenge: bool = True, max_timeout: float = 100) -> bool:
+        """Poll until every condition holds; False on timeout or exhausted budget."""
+        selectors = list(selectors)
+        key = f"{self.host}/{stage}"
+        adaptive = self.tracker.timeout(key, max_timeout)
+        timeout = min(adaptive, self.remaining())
+        t0 = time.monotonic()
+        end = t0 + timeout
+        idle_js = JS_NETWORK_IDLE.replace("{idle_ms}", str(NETWORK_IDLE_MS))
+        cleared = not challenge
+        ok = False
+        while True:
+            if not cleared:
+                cleared = self._challenge_cleared(t0)
+                if cleared:
+                    self.timings[f"{stage}.challenge"] = time.monotonic() - t0
+                    STAGE_SECONDS.observe(self.timings[f"{stage}.challenge"], page=self.kind, stage=f"{stage}.challenge")
+            if cleared and self._visible(selectors) and (not network_idle or self._eval(idle_js)):
+                ok = True
+                break
+            if time.monotonic() >= end:
+                break
+            time.sleep(WAIT_POLL_SEC)
+        elapsed = time.monotonic() - t0
+        self.timings[stage] = elapsed
+        STAGE_SECONDS.observe(elapsed, page=self.kind, stage=stage)
+        # a timeout is a sample too (a lower bound on the load time): otherwise a host
+        # that got slower for good keeps timing out at the old p95 and never recovers.
+        # Waits cut short by the page budget say nothing about the host, so skip those.
+        if ok or timeout >= adaptive:
+            self.tracker.record(key, elapsed)
+        if not ok:
+            WAIT_TIMEOUTS.inc(page=self.kind, stage=stage)
+            dprint(f"{self.host} {stage}: not ready after {elapsed:.1f}s (timeout {timeout:.1f}s)")
+        return ok
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time an arbitrary block (navigation, clicks, parsing) as a named stage."""
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - t0
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            STAGE_SECONDS.observe(elapsed, page=self.kind, stage=name)
+
+    def summary(self) -> str:
+        total = time.monotonic() - self.started
+        stages = ", ".join(f"{k}={v:.2f}s" for k, v in self.timings.items())
+        return f"{self.host} total={total:.2f}s [{stages}]"
@@ -0,0 +1,197 @@
+# profiling.py
+# Opt-in CPU and memory profiling for the long-running loops: once armed (env
+# PROFILE_CYCLES=N at start, or SIGUSR1 at runtime) the next N cycles / tokens
+# run under cProfile and tracemalloc, then a timestamped .prof file and a text
+# report (top functions + top allocation growth) are written to PROFILE_DIR.
+import os, io, time, signal, pstats, cProfile, threading, tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+from metrics import get_logger
+
+PROFILE_CYCLES = int(os.getenv("PROFILE_CYCLES", "0"))                  # armed at start for N cycles/tokens (0 = off)
+PROFILE_SIGNAL_CYCLES = int(os.getenv("PROFILE_SIGNAL_CYCLES", "10"))   # N armed by each SIGUSR1
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "30"))                        # rows per report section
+PROFILE_TRACE_FRAMES = int(os.getenv("PROFILE_TRACE_FRAMES", "1"))       # tracemalloc frames per allocation
+
+log = get_logger("profile")
+dprint = log.debug
+
+_PROFILERS: List["Profiler"] = []
+_FORWARD_TO: Optional[Callable[[], Iterable[int]]] = None   # child pids that also get the signal
+_OWNER_PID = None                                            # process that installed the forwarding
+
+
+class Profiler:
+    """
+        PROFILER = Profiler("trader")
+
+        with PROFILER.profile():              # one counted unit (a cycle, a token)
+            _process_one_token(addr)
+        with PROFILER.profile(count=False):   # work of the same unit in another thread
+            ...
+
+    Does nothing until armed. Each thread gets its own cProfile.Profile (merged
+    into one report); tracemalloc is process-wide, so its diff also covers
+    threads that are not wrapped. The report is written once the N-th unit and
+    every section still running have finished.
+    """
+
+    def __init__(self, name: str, cycles: int = PROFILE_CYCLES, out_dir: str = PROFILE_DIR):
+        self.name = name
+        self.out_dir = out_dir
+        self._remaining = 0
+        self._signalled = 0        # set from the signal handler, picked up by the next section
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles: Dict[int, cProfile.Profile] = {}
+        self._running = 0          # sections currently inside profile()
+        self._units = 0
+        self._started = None
+        self._snapshot = None
+        self._own_tracemalloc = False
+        _PROFILERS.append(self)
+        if cycles > 0:
+            self.arm(cycles)
+
+    @property
+    def armed(self) -> bool:
+        return self._remaining > 0 or self._signalled > 0
+
+    def arm(self, cycles: int):
+        """Profile the next `cycles` units (adds to a run in progress)."""
+        with self._lock:
+            self._remaining += max(0, cycles)
+        dprint(f"{self.name}: profiling the next {self._remaining} unit(s)")
+
+    def _begin(self):
+        # first section of a run; caller holds the lock
+        self._started = time.time()
+        self._units = 0
+        self._profiles = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACE_FRAMES)
+            self._own_tracemalloc = True
+        self._snapshot = tracemalloc.take_snapshot()
+
+    @contextmanager
+    def profile(self, count: bool = True):
+        # the common case (not armed, or nested in a profiled section) costs a couple of checks
+        if not (self._remaining or self._signalled) or getattr(self._local, "active", False):
+            yield
+            return
+        with self._lock:
+            if self._signalled:
+                self._remaining += self._signalled
+                self._signalled = 0
+                dprint(f"{self.name}: profiling the next {self._remaining} unit(s) (signal)")
+            if not self._remaining:
+                prof = None
+            else:
+                if self._started is None:
+                    self._begin()
+                ident = threading.get_ident()
+                prof = self._profiles.get(ident)
+                if prof is None:
+                    prof = self._profiles[ident] = cProfile.Profile()
+                self._running += 1
+        if prof is None:
+            yield
+            return
+
+        self._local.active = True
+        try:
+            prof.enable()
+            enabled = True
+        except ValueError:
+            enabled = False     # another profiler is active in this thread
+        try:
+            yield
+        finally:
+            if enabled:
+                prof.disable()
+            self._local.active = False
+            with self._lock:
+                self._running -= 1
+                if count:
+                    self._units += 1
+                    self._remaining = max(0, self._remaining - 1)
+                finished = not self._remaining and not self._running and self._started is not None
+                if finished:
+                    profiles, self._profiles = list(self._profiles.values()), {}
+                    started, snapshot, units = self._started, self._snapshot, self._units
+                    self._started = self._snapshot = None
+            if finished:
+                self._dump(profiles, started, snapshot, units)
+
+    def _dump(self, profiles: List[cProfile.Profile], started: float, before, units: int):
+        try:
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+                self._own_tracemalloc = False
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+        base = os.path.join(self.out_dir, f"{self.name}-{stamp}-{os.getpid()}")
+
+        stats = None
+        for prof in profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(prof)
+                else:
+                    stats.add(prof)
+            except TypeError:
+                pass    # a thread's profile that never recorded anything
+        if stats is not None:
+            stats.dump_stats(f"{base}.prof")
+
+        buf = io.StringIO()
+        buf.write(f"# {self.name}: {units} unit(s) in {time.time() - started:.1f}s, "
+                  f"{len(profiles)} thread(s), pid {os.getpid()}\n\n")
+        buf.write(f"## CPU: top {PROFILE_TOP} by cumulative time\n")
+        if stats is not None:
+            stats.stream = buf
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        buf.write(f"## Memory: traced now {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+        buf.write(f"## Memory: top {PROFILE_TOP} allocation growth since the first unit\n")
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        for stat in diff[:PROFILE_TOP]:
+            buf.write(f"{stat}\n")
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+        log.info(f"{self.name}: profile of {units} unit(s) written to {base}.txt / .prof")
+
+
+def _on_signal(signum, frame):
+    # no locks or logging here: the handler may interrupt a thread holding them
+    for p in _PROFILERS:
+        p._signalled = PROFILE_SIGNAL_CYCLES
+    # forked children inherit this handler, but only the installing process forwards
+    if _FORWARD_TO is not None and os.getpid() == _OWNER_PID:
+        for pid in _FORWARD_TO():
+            try:
+                os.kill(pid, signum)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+def install_signal(signum: Optional[int] = getattr(signal, "SIGUSR1", None),
+                   forward_to: Optional[Callable[[], Iterable[int]]] = None):
+    """
+    `kill -USR1 <pid>` arms every profiler for PROFILE_SIGNAL_CYCLES units (main thread only).
+    `forward_to()` returns worker pids the signal is passed on to, so signalling the
+    parent also arms its worker processes.
+    """
+    global _FORWARD_TO, _OWNER_PID
+    if signum is None:
+        return
+    if forward_to is not None:
+        _FORWARD_TO, _OWNER_PID = forward_to, os.getpid()
+    try:
+        signal.signal(signum, _on_signal)
+    except ValueError as e:
+        log.warning(f"Profiling signal not installed: {e}")
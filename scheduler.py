@@ -0,0 +1,142 @@
+# scheduler.py
+# Fixed-rate loop with jitter: ticks are scheduled from a fixed origin, so the
+# period does not stretch with the work done in each cycle. A cycle that overruns
+# is followed at once by the next one (still within its slot); slots that passed
+# entirely are skipped instead of run in a burst.
+# FairExecutor shares one worker pool between several such loops.
+import os, time, random, threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, Optional
+import metrics
+from metrics import get_logger
+
+
+log = get_logger("scheduler")
+dprint = log.debug
+
+START_LAG = metrics.histogram("scheduler_start_lag_seconds", "Actual minus scheduled cycle start", ("loop",))
+CYCLE_SECONDS = metrics.histogram("scheduler_cycle_seconds", "Duration of one scheduled cycle", ("loop",))
+MISSED = metrics.counter("scheduler_missed_slots_total", "Slots skipped because a cycle overran", ("loop",))
+
+
+class FixedRateScheduler:
+    """
+    Call `tick()` every `interval` seconds (each start shifted by up to ±jitter):
+
+        sched = FixedRateScheduler(60, jitter=5, name="trending")
+        sched.run(run_cycle)
+
+    Start lag (actual start - scheduled start), cycle time and missed slots are
+    logged per cycle and kept in `stats`.
+    """
+
+    def __init__(self, interval: float, jitter: float = 0.0, name: str = "loop"):
+        self.interval = max(0.1, float(interval))
+        self.jitter = max(0.0, min(float(jitter), self.interval / 2))
+        self.name = name
+        self.stats = {"cycles": 0, "missed": 0, "errors": 0, "last_lag": 0.0, "max_lag": 0.0, "last_duration": 0.0}
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, tick: Callable[[], None], max_cycles: Optional[int] = None, offset: float = 0.0):
+        """`offset` shifts every slot, e.g. to stagger loops that share resources."""
+        origin = time.monotonic() + max(0.0, offset)
+        slot = 0
+        while not self._stop.is_set():
+            scheduled = origin + slot * self.interval
+            start_at = scheduled + (random.uniform(-self.jitter, self.jitter) if slot else 0.0)
+            delay = start_at - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+
+            t0 = time.monotonic()
+            lag = max(0.0, t0 - scheduled)
+            try:
+                tick()
+            except Exception as e:
+                self.stats["errors"] += 1
+                log.error(f"{self.name}: cycle failed: {e}")
+            duration = time.monotonic() - t0
+
+            # a cycle that overran starts the next one right away while that slot's period
+            # is still running; only slots whose whole period has passed count as missed
+            next_slot = max(slot + 1, int(max(0.0, time.monotonic() - origin) // self.interval))
+            missed = next_slot - slot - 1
+            self.stats["cycles"] += 1
+            self.stats["missed"] += missed
+            self.stats["last_lag"] = lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+            self.stats["last_duration"] = duration
+            START_LAG.observe(lag, loop=self.name)
+            CYCLE_SECONDS.observe(duration, loop=self.name)
+            if missed:
+                MISSED.inc(missed, loop=self.name)
+            dprint(f"{self.name}: cycle {self.stats['cycles']} took {duration:.1f}s, "
+                   f"start lag {lag:.1f}s, missed {missed} slot(s) (total {self.stats['missed']})")
+            slot = next_slot
+            if max_cycles and self.stats["cycles"] >= max_cycles:
+                break
+
+
+class FairExecutor:
+    """
+    Worker pool shared by several submitters, served round-robin by key:
+
+        pages = FairExecutor(workers=5)
+        futures = [pages.submit("eth", scrape_page, n) for n in range(1, 6)]
+
+    A key with many queued tasks (a deep window) cannot starve the others; each
+    free worker takes the next task of the next key that has one.
+    """
+
+    def __init__(self, workers: int, name: str = "fair"):
+        self.workers = max(1, workers)
+        self._queues: "OrderedDict[str, Deque]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self.stats: Dict[str, int] = {}     # key -> tasks run
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True).start()
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+            self._queues.setdefault(key, deque()).append((future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def _next(self):
+        with self._cond:
+            while not self._shutdown and not any(self._queues.values()):
+                self._cond.wait()
+            for key in list(self._queues):
+                queue = self._queues[key]
+                self._queues.move_to_end(key)    # the next pick starts after this key
+                if queue:
+                    self.stats[key] = self.stats.get(key, 0) + 1
+                    return queue.popleft()
+            return None
+
+    def _work(self):
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self):
+        """Stop the workers once the queued tasks are done."""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
@@ -0,0 +1,106 @@
+# scrape_jobs.py
+# Bounded scrape worker pool with single-flight: concurrent requests for the same
+# key share one job (and one browser lease). Jobs can be awaited in the request
+# (sync) or returned as an id to poll (async), and finished jobs are kept for a
+# while so pollers can fetch the result.
+import os, time, uuid, threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", os.getenv("BROWSER_POOL_SIZE", "1")))
+SCRAPE_MAX_PENDING = int(os.getenv("SCRAPE_MAX_PENDING", "100"))    # queued + running jobs
+SCRAPE_RESULT_TTL_SEC = int(os.getenv("SCRAPE_RESULT_TTL_SEC", "300"))
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key: str, future: Future):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.future = future
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """True once finished (waits up to `timeout` seconds, forever if None)."""
+        try:
+            self.future.result(timeout=timeout)
+        except FutureTimeout:
+            return False
+        except Exception:
+            pass
+        return True
+
+    def result(self, timeout: Optional[float] = None):
+        return self.future.result(timeout=timeout)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "key": self.key,
+            "status": "done" if self.done else "pending",
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ScrapeJobs:
+    """
+        jobs = ScrapeJobs(scrape_fn)
+        job = jobs.submit(addr)          # joins the in-flight job for addr if there is one
+        job.result()                     # sync: block for the result
+        jobs.get(job.id)                 # async: look it up again later
+    """
+
+    def __init__(self, fn: Callable[..., object], workers: int = SCRAPE_WORKERS,
+                 max_pending: int = SCRAPE_MAX_PENDING, result_ttl: int = SCRAPE_RESULT_TTL_SEC):
+        self.fn = fn
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scrape")
+        self._inflight: Dict[str, Job] = {}    # key -> unfinished job
+        self._jobs: Dict[str, Job] = {}        # id -> job (finished ones until result_ttl)
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _finished(self, job: Job):
+        with self._lock:
+            job.finished_at = time.time()
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+
+    def submit(self, key: str, *args) -> Job:
+        """Start fn(*args) (default fn(key)) unless a job for `key` is already in flight."""
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                self.coalesced += 1
+                return job
+            self._expire()
+            if len(self._inflight) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._inflight)} scrape jobs pending")
+            job = Job(key, self._executor.submit(self.fn, *(args or (key,))))
+            self._inflight[key] = job
+            self._jobs[job.id] = job
+        job.future.add_done_callback(lambda _f: self._finished(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"pending": len(self._inflight), "tracked": len(self._jobs), "coalesced": self.coalesced}
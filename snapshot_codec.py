@@ -0,0 +1,112 @@
+# snapshot_codec.py
+# Optional compact encoding for snapshot records: msgpack with keyframes stored
+# column-wise (contract table, packed float64 columns, per-window constants
+# instead of per-row chain/link). Encoded values carry a tag so JSON records
+# written before (or by SNAPSHOT_CODEC=json writers) still decode.
+import os, json
+from array import array
+from typing import Dict, List, Union
+
+def _codec(name: str) -> str:
+    if name != "msgpack":
+        return "json"
+    try:
+        import msgpack  # noqa: F401  (optional, needed for the compact format)
+        return "msgpack"
+    except ImportError:
+        return "json"
+
+# "json" | "msgpack" (falls back to json when msgpack is missing). Readers understand
+# both; switch writers only once every reader runs a version that has this module.
+SNAPSHOT_CODEC = _codec(os.getenv("SNAPSHOT_CODEC", "json"))
+
+# 0xc1 is unused by msgpack and never starts a JSON document
+MAGIC = b"\xc1S"
+FORMAT_V1 = 1
+
+
+# ----------------------------
+# Columnar keyframes
+# ----------------------------
+def _link_base(values: List, contracts: List[str]):
+    """The common prefix when every link is "{base}/{contract}", else None."""
+    if not values or not isinstance(values[0], str):
+        return None
+    base = values[0].rsplit("/", 1)[0]
+    if all(v == f"{base}/{c}" for v, c in zip(values, contracts)):
+        return base
+    return None
+
+def _pack_rows(rows: List[Dict]) -> Dict:
+    contracts = [t["contract"] for t in rows]
+    names = []
+    for t in rows:
+        names.extend(k for k in t if k not in names and k != "contract")
+    cols = {}
+    for k in names:
+        values = [t.get(k) for t in rows]
+        missing = [i for i, t in enumerate(rows) if k not in t]
+        if missing:
+            cols[k] = {"v": values, "missing": missing}
+        elif k == "rank" and values == list(range(1, len(rows) + 1)):
+            cols[k] = {"pos": 1}
+        elif k == "link" and _link_base(values, contracts) is not None:
+            cols[k] = {"base": _link_base(values, contracts)}
+        elif all(type(v) is float for v in values):
+            cols[k] = {"f64": array("d", values).tobytes()}
+        elif all(v == values[0] for v in values):
+            cols[k] = {"const": values[0]}
+        else:
+            cols[k] = {"v": values}
+    return {"n": len(rows), "contracts": contracts, "cols": cols}
+
+def _unpack_rows(packed: Dict) -> List[Dict]:
+    contracts = packed["contracts"]
+    n = packed["n"]
+    columns = []
+    for k, col in packed["cols"].items():
+        if "f64" in col:
+            values = array("d", col["f64"]).tolist()
+        elif "pos" in col:
+            values = list(range(1, n + 1))
+        elif "base" in col:
+            values = [f"{col['base']}/{c}" for c in contracts]
+        elif "const" in col:
+            values = [col["const"]] * n
+        else:
+            values = col["v"]
+        columns.append((k, values, set(col.get("missing", ()))))
+    rows = []
+    for i, contract in enumerate(contracts):
+        row = {"contract": contract}
+        for k, values, missing in columns:
+            if i not in missing:
+                row[k] = values[i]
+        rows.append(row)
+    return rows
+
+
+# ----------------------------
+# Records
+# ----------------------------
+def encode(record: Dict, codec: str = None) -> Union[bytes, str]:
+    """Serialize a keyframe/delta record with `codec` (default SNAPSHOT_CODEC)."""
+    if (_codec(codec) if codec else SNAPSHOT_CODEC) != "msgpack":
+        return json.dumps(record)
+    import msgpack
+    if record.get("type") == "key":
+        record = {**record, "rows": _pack_rows(record["rows"]), "columnar": 1}
+    return MAGIC + bytes([FORMAT_V1]) + msgpack.packb(record, use_bin_type=True)
+
+def decode(raw: Union[bytes, str]):
+    """Inverse of encode() for either codec (JSON values may be str or bytes)."""
+    if isinstance(raw, bytes) and raw.startswith(MAGIC):
+        version = raw[len(MAGIC)]
+        if version != FORMAT_V1:
+            raise ValueError(f"Unknown snapshot format version {version}")
+        import msgpack
+        record = msgpack.unpackb(raw[len(MAGIC) + 1:], raw=False, strict_map_key=False)
+        if record.pop("columnar", 0):
+            record["rows"] = _unpack_rows(record["rows"])
+        return record
+    return json.loads(raw)
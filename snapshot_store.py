@@ -0,0 +1,361 @@
+# snapshot_store.py
+# Versioned trending windows in Redis as periodic keyframes plus small deltas
+# against the previous version, with retention by age and/or count. Any retained
+# version is rebuilt from the nearest keyframe at or below it.
+import os, json, math, time, hashlib, threading
+from typing import Dict, List, Optional, Tuple
+import event_bus
+import snapshot_codec
+from metrics import get_logger
+
+SNAPSHOT_KEYFRAME_EVERY = int(os.getenv("SNAPSHOT_KEYFRAME_EVERY", "60"))       # full copy every N versions
+SNAPSHOT_RETAIN_SEC = int(os.getenv("SNAPSHOT_RETAIN_SEC", "86400"))            # 0 = no age limit
+SNAPSHOT_RETAIN_VERSIONS = int(os.getenv("SNAPSHOT_RETAIN_VERSIONS", "0"))      # 0 = no count limit
+SNAPSHOT_PRUNE_EVERY = int(os.getenv("SNAPSHOT_PRUNE_EVERY", "20"))             # prune every N saves
+SNAPSHOT_COMMIT_RETRIES = 3          # re-encode against the winner when another writer got there first
+
+log = get_logger("snapshots")
+dprint = log.debug
+
+KEYFRAME, DELTA = "key", "delta"
+
+# One round trip per cycle: check the base version, skip a window identical to
+# the latest one, bump the version, store the record, diff the new ranks against
+# the previous window's and emit every change event.
+# Every key it touches is passed in KEYS (the new window's key is known up front,
+# since the commit only succeeds on top of the expected base version).
+#   KEYS: latest_version, versions, keyframes, ranks, event stream, fingerprint,
+#         window key of base + 1
+#   ARGV: base version, record, record type, as_of epoch, as_of iso, chain,
+#         rank move threshold, publish (0/1), stream maxlen,
+#         pub/sub channel ("" = none), fingerprint ("" = always commit),
+#         then contract, rank pairs
+COMMIT_LUA = """
+local latest = tonumber(redis.call('GET', KEYS[1]) or '0')
+local base = tonumber(ARGV[1])
+if latest ~= base then
+    return {-1, latest}
+end
+if ARGV[11] ~= '' and redis.call('GET', KEYS[6]) == ARGV[11] then
+    return {0, latest}
+end
+local ver = latest + 1
+redis.call('SET', KEYS[1], ver)
+redis.call('SET', KEYS[7], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[4], ver)
+if ARGV[3] == 'key' then
+    redis.call('ZADD', KEYS[3], ver, ver)
+end
+
+local prev = {}
+local flat = redis.call('HGETALL', KEYS[4])
+for i = 1, #flat, 2 do prev[flat[i]] = tonumber(flat[i + 1]) end
+
+local curr, order = {}, {}
+for i = 12, #ARGV, 2 do
+    curr[ARGV[i]] = tonumber(ARGV[i + 1])
+    order[#order + 1] = ARGV[i]
+end
+
+local events = {}
+local function emit(change, contract, old_rank, new_rank)
+    local id_old = old_rank and tostring(old_rank) or 'None'
+    local id_new = new_rank and tostring(new_rank) or 'None'
+    events[#events + 1] = cjson.encode({
+        event_id = ARGV[6] .. ':' .. contract .. ':' .. ver .. ':' .. change .. ':' .. id_old .. ':' .. id_new,
+        as_of = ARGV[5], change_type = change, chain = ARGV[6], contract = contract,
+        old_rank = old_rank or cjson.null, new_rank = new_rank or cjson.null, window_version = ver,
+    })
+end
+
+local threshold = tonumber(ARGV[7])
+local moved = {}
+for _, contract in ipairs(order) do
+    local old_rank, new_rank = prev[contract], curr[contract]
+    if old_rank == nil then
+        emit('ADDED', contract, nil, new_rank)
+    elseif math.abs(old_rank - new_rank) >= threshold then
+        moved[#moved + 1] = {contract, old_rank, new_rank}
+    end
+end
+local removed = {}
+for contract, old_rank in pairs(prev) do
+    if curr[contract] == nil then removed[#removed + 1] = {contract, old_rank} end
+end
+table.sort(removed, function(a, b) return a[2] < b[2] end)
+for _, e in ipairs(removed) do emit('REMOVED', e[1], e[2], nil) end
+for _, e in ipairs(moved) do emit('MOVED', e[1], e[2], e[3]) end
+
+if ARGV[11] ~= '' then
+    redis.call('SET', KEYS[6], ARGV[11])
+else
+    redis.call('DEL', KEYS[6])
+end
+redis.call('DEL', KEYS[4])
+for i = 12, #ARGV, 1000 do
+    redis.call('HSET', KEYS[4], unpack(ARGV, i, math.min(i + 999, #ARGV)))
+end
+
+if ARGV[8] == '1' then
+    for _, payload in ipairs(events) do
+        redis.call('XADD', KEYS[5], 'MAXLEN', '~', ARGV[9], '*', 'payload', payload)
+        if ARGV[10] ~= '' then redis.call('PUBLISH', ARGV[10], payload) end
+    end
+end
+return {ver, events}
+"""
+
+
+def _same(a, b) -> bool:
+    # NaN (unparsable numbers) should not count as a change every cycle
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+def fingerprint(window: List[Dict]) -> str:
+    """Content hash of a window (every field of every row, in order)."""
+    data = json.dumps(window, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _strip_rank(row: Dict, i: int) -> Dict:
+    """Rank is the 1-based position in almost every row; only store it when it is not."""
+    if row.get("rank") == i + 1:
+        row = dict(row)
+        del row["rank"]
+    return row
+
+def encode_delta(prev: List[Dict], curr: List[Dict]) -> Dict:
+    """
+    Delta from prev to curr:
+      order: per position, the index of the row in prev, or the contract of a new row
+      changes: {position: fields that differ from the matched prev row (all fields for new rows)}
+    """
+    prev_pos = {t["contract"]: i for i, t in enumerate(prev)}
+    order, changes = [], {}
+    for i, t in enumerate(curr):
+        j = prev_pos.get(t["contract"])
+        row = _strip_rank(t, i)
+        if j is None:
+            order.append(t["contract"])
+            changes[str(i)] = {k: v for k, v in row.items() if k != "contract"}
+            continue
+        order.append(j)
+        old = _strip_rank(prev[j], j)
+        changed = {k: v for k, v in row.items() if k not in old or not _same(old[k], v)}
+        # rank is always rebuilt from the position, never deleted
+        dropped = [k for k in old if k not in row and k != "rank"]
+        if dropped:
+            changed["__del__"] = dropped
+        if changed:
+            changes[str(i)] = changed
+    return {"order": order, "changes": changes}
+
+def apply_delta(prev: List[Dict], delta: Dict) -> List[Dict]:
+    out = []
+    for i, ref in enumerate(delta["order"]):
+        if isinstance(ref, int):
+            row = dict(prev[ref])
+            row["rank"] = i + 1
+        else:
+            row = {"contract": ref, "rank": i + 1}
+        changes = delta["changes"].get(str(i), {})
+        for k in changes.get("__del__", ()):
+            row.pop(k, None)
+        row.update({k: v for k, v in changes.items() if k != "__del__"})
+        out.append(row)
+    return out
+
+
+def _binary_client(r):
+    pool = r.connection_pool
+    if not pool.connection_kwargs.get("decode_responses"):
+        return r
+    kwargs = {**pool.connection_kwargs, "decode_responses": False}
+    return r.__class__(connection_pool=pool.__class__(connection_class=pool.connection_class, **kwargs))
+
+
+class SnapshotStore:
+    """
+    Window history under one key prefix ("trending" by default):
+
+        {prefix}:latest_version      string int
+        {prefix}:window:{ver}        record (JSON or tagged msgpack), keyframe or delta against
+                                     ver-1 (a bare JSON array is a legacy full window)
+        {prefix}:versions            zset ver -> as_of epoch seconds
+        {prefix}:keyframes           zset ver -> ver
+        {prefix}:window:ranks        hash contract -> rank of the latest window (diff base)
+        {prefix}:window:fingerprint  content hash of the latest window
+
+        store = SnapshotStore(r)
+        ver, events = store.commit(window, as_of, chain="sol")
+        prev = store.load(ver - 1)
+
+    Only the record for the new version is written each cycle, so both memory
+    and the AOF grow by a delta rather than a full window.
+    """
+
+    def __init__(self, r, prefix: str = "trending", keyframe_every: int = SNAPSHOT_KEYFRAME_EVERY,
+                 retain_sec: int = SNAPSHOT_RETAIN_SEC, retain_versions: int = SNAPSHOT_RETAIN_VERSIONS):
+        self.r = r
+        self.k_latest = f"{prefix}:latest_version"
+        self.k_window = f"{prefix}:window:{{ver}}"
+        self.k_versions = f"{prefix}:versions"
+        self.k_keyframes = f"{prefix}:keyframes"
+        self.k_ranks = f"{prefix}:window:ranks"
+        self.k_fingerprint = f"{prefix}:window:fingerprint"
+        self.keyframe_every = max(1, keyframe_every)
+        self.retain_sec = retain_sec
+        self.retain_versions = retain_versions
+        self._last: Optional[Tuple[int, List[Dict]]] = None   # (ver, window) written by this process
+        self._saves = 0
+        self._ranks_seeded = False
+        self._commit = r.register_script(COMMIT_LUA)
+        # records may be binary (SNAPSHOT_CODEC=msgpack), so read them without decoding to str
+        self._rb = _binary_client(r)
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+    def latest_version(self) -> int:
+        v = self.r.get(self.k_latest)
+        return int(v) if v else 0
+
+    def _record(self, ver: int, window: List[Dict], prev: Optional[List[Dict]], as_of_iso: str) -> Dict:
+        full = {"type": KEYFRAME, "as_of": as_of_iso, "rows": window}
+        if prev is None or ver % self.keyframe_every == 0:
+            return full
+        delta = {"type": DELTA, "as_of": as_of_iso, **encode_delta(prev, window)}
+        # a window that mostly changed is cheaper (and faster to load) as a keyframe
+        if len(snapshot_codec.encode(delta)) * 2 > len(snapshot_codec.encode(full)):
+            return full
+        return delta
+
+    def _seed_ranks(self):
+        """The diff base predates this store (or was lost): rebuild it from the latest window once."""
+        if self._ranks_seeded:
+            return
+        self._ranks_seeded = True
+        if self.r.exists(self.k_ranks):
+            return
+        prev = self.load(self.latest_version())
+        if prev:
+            self.r.hset(self.k_ranks, mapping={t["contract"]: t["rank"] for t in prev})
+
+    def commit(self, window: List[Dict], as_of, chain: str = "sol", rank_move_threshold: int = 999999,
+               publish: bool = True, skip_unchanged: bool = True) -> Tuple[int, Optional[List[Dict]]]:
+        """
+        Store `window` as the next version and emit ADDED / REMOVED / MOVED events to
+        the token_changed stream, all in one atomic script call. Returns (version, events);
+        when the window is identical to the latest one nothing is written and the
+        result is (latest version, None).
+        """
+        self._seed_ranks()
+        fp = fingerprint(window) if skip_unchanged else ""
+        base = self._last[0] if self._last else self.latest_version()
+        ranks = []
+        for t in window:
+            ranks += [t["contract"], t["rank"]]
+        for _ in range(SNAPSHOT_COMMIT_RETRIES):
+            prev = self._last[1] if self._last and self._last[0] == base else self.load(base)
+            record = self._record(base + 1, window, prev or None, as_of.isoformat())
+            ver, events = self._commit(
+                keys=[self.k_latest, self.k_versions, self.k_keyframes, self.k_ranks, event_bus.EVENT_STREAM,
+                      self.k_fingerprint, self.k_window.format(ver=base + 1)],
+                args=[base, snapshot_codec.encode(record), record["type"], as_of.timestamp(),
+                      as_of.isoformat(), chain, rank_move_threshold, int(publish), event_bus.EVENT_STREAM_MAXLEN,
+                      event_bus.EVENT_CHANNEL if event_bus.EVENT_PUBSUB_COMPAT else "", fp, *ranks])
+            if ver == 0:
+                return int(events), None
+            if ver != -1:
+                break
+            # another writer committed in between: our delta base is stale
+            dprint(f"Commit on v{base} lost to v{events}, retrying")
+            base = int(events)
+        else:
+            raise RuntimeError(f"Could not commit window after {SNAPSHOT_COMMIT_RETRIES} attempts")
+
+        self._last = (ver, window)
+        self._saves += 1
+        if self._saves % max(1, SNAPSHOT_PRUNE_EVERY) == 0:
+            self.prune()
+        return ver, [json.loads(e) for e in events]
+
+    def save(self, window: List[Dict], as_of) -> int:
+        """Store `window` as the next version without publishing events; returns the new version."""
+        return self.commit(window, as_of, publish=False, skip_unchanged=False)[0]
+
+    # ----------------------------
+    # Reading
+    # ----------------------------
+    def _decode(self, raw: Optional[bytes]) -> Optional[Dict]:
+        if not raw:
+            return None
+        rec = snapshot_codec.decode(raw)
+        if isinstance(rec, list):    # written before keyframes/deltas existed
+            return {"type": KEYFRAME, "rows": rec}
+        return rec
+
+    def load(self, version: int) -> List[Dict]:
+        """Rebuild `version` from the closest keyframe (one MGET); [] if it is not retained."""
+        if version <= 0:
+            return []
+        if self._last and self._last[0] == version:
+            return self._last[1]
+        kf = self.r.zrevrangebyscore(self.k_keyframes, version, "-inf", start=0, num=1)
+        start = int(kf[0]) if kf else version
+        raws = self._rb.mget([self.k_window.format(ver=v) for v in range(start, version + 1)])
+        records = [self._decode(raw) for raw in raws]
+        # replay from the last keyframe in the chain (the target itself may be one)
+        base = next((i for i in range(len(records) - 1, -1, -1)
+                     if records[i] is not None and records[i]["type"] == KEYFRAME), None)
+        if base is None or any(rec is None for rec in records[base:]):
+            if records[-1] is not None:
+                dprint(f"Version {version} cannot be rebuilt: its keyframe or a delta is missing")
+            return []
+        window = records[base]["rows"]
+        for rec in records[base + 1:]:
+            window = apply_delta(window, rec)
+        return window
+
+    def load_current(self) -> Tuple[int, List[Dict]]:
+        """(latest version, its window)."""
+        ver = self.latest_version()
+        return ver, self.load(ver)
+
+    def as_of(self, version: int) -> Optional[float]:
+        return self.r.zscore(self.k_versions, version)
+
+    # ----------------------------
+    # Retention
+    # ----------------------------
+    def prune(self) -> int:
+        """Drop versions outside the retention window, never cutting a delta chain; returns how many."""
+        latest = self.latest_version()
+        keep_from = 1
+        if self.retain_versions > 0:
+            keep_from = max(keep_from, latest - self.retain_versions + 1)
+        if self.retain_sec > 0:
+            oldest = self.r.zrangebyscore(self.k_versions, time.time() - self.retain_sec, "+inf", start=0, num=1)
+            keep_from = max(keep_from, int(oldest[0]) if oldest else latest)
+        # deltas need their keyframe: keep everything from the last keyframe at or below keep_from
+        floor = self.r.zrevrangebyscore(self.k_keyframes, keep_from, "-inf", start=0, num=1)
+        if not floor or int(floor[0]) <= 1:
+            return 0
+        floor = int(floor[0])
+        # versions are written in time order, so everything older than the floor sorts before it
+        floor_ts = self.r.zscore(self.k_versions, floor)
+        if floor_ts is None:
+            return 0
+        old_versions = [int(v) for v in self.r.zrangebyscore(self.k_versions, "-inf", f"({floor_ts}")
+                        if int(v) < floor]
+        if not old_versions:
+            return 0
+        pipe = self.r.pipeline()
+        for i in range(0, len(old_versions), 500):
+            batch = old_versions[i:i + 500]
+            pipe.delete(*[self.k_window.format(ver=v) for v in batch])
+            pipe.zrem(self.k_versions, *batch)
+        pipe.zremrangebyscore(self.k_keyframes, "-inf", f"({floor}")
+        pipe.execute()
+        dprint(f"Pruned {len(old_versions)} versions below v{floor}")
+        return len(old_versions)
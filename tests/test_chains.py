@@ -0,0 +1,16 @@
+from chains import chain_config
+
+
+def test_evm_pattern_matches_pair_addresses_and_pool_ids():
+    addr_re = chain_config("base").addr_re
+    pair = "0x" + "ab" * 20
+    pool_id = "0x" + "cd" * 32
+    assert addr_re.search(f'href="/base/{pair}"').group(1) == pair
+    assert addr_re.search(f'href="/base/{pool_id}"').group(1) == pool_id
+    assert addr_re.search(f"/base/{pool_id}?maker=1").group(1) == pool_id
+
+
+def test_evm_pattern_rejects_truncated_ids():
+    addr_re = chain_config("eth").addr_re
+    assert addr_re.search("/ethereum/0x" + "ab" * 25) is None    # 50 hex: neither length
+    assert addr_re.search("/base/0x" + "ab" * 20) is None         # other chain
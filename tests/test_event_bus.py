@@ -0,0 +1,60 @@
+import time
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from event_bus import EventConsumer, publish
+
+STREAM = "test:stream"
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def consumer(r, **kw):
+    kw.setdefault("claim_idle_ms", 1)
+    return EventConsumer(r, "g", consumer="c1", stream=STREAM, **kw)
+
+
+def read_all(c):
+    # the first read also replays (empty) own pending entries
+    return c.read(count=10, block_ms=1) or c.read(count=10, block_ms=1)
+
+
+def test_released_entry_is_redelivered(r):
+    c = consumer(r)
+    publish(r, {"contract": "a"}, stream=STREAM)
+    [(entry_id, event)] = read_all(c)
+
+    time.sleep(0.01)
+    assert c.read(block_ms=1) == []     # still in flight: not reclaimed by ourselves
+    c.release(entry_id)
+    time.sleep(0.01)
+    assert c.read(block_ms=1) == [(entry_id, event)]
+    c.ack(entry_id)
+    assert c.lag()["pending"] == 0
+
+
+def test_entry_dropped_after_max_deliveries(r):
+    c = consumer(r, max_deliveries=2)
+    publish(r, {"contract": "poison"}, stream=STREAM)
+    [(entry_id, _)] = read_all(c)       # delivery 1
+    c.release(entry_id)
+    time.sleep(0.01)
+    assert [e for e, _ in c.read(block_ms=1)] == [entry_id]   # delivery 2
+    c.release(entry_id)
+    time.sleep(0.01)
+    assert c.read(block_ms=1) == []     # delivery 3 is over the cap: acked
+    assert c.lag()["pending"] == 0
+
+
+def test_close_removes_consumer(r):
+    c = consumer(r)
+    assert [i["name"] for i in r.xinfo_consumers(STREAM, "g")] == []
+    publish(r, {"contract": "a"}, stream=STREAM)
+    read_all(c)
+    assert [i["name"] for i in r.xinfo_consumers(STREAM, "g")] == ["c1"]
+    c.close()
+    assert r.xinfo_consumers(STREAM, "g") == []
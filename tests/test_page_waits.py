@@ -0,0 +1,46 @@
+import time
+import page_waits
+from page_waits import LatencyTracker, PageWaiter
+
+
+class SlowPage:
+    """Stand-in for an SB session: no challenge, the selector shows up `load_sec` after navigation."""
+
+    def __init__(self, load_sec: float):
+        self.ready_at = time.monotonic() + load_sec
+
+    def execute_script(self, js):
+        return False
+
+    def is_element_visible(self, selector):
+        return time.monotonic() >= self.ready_at
+
+
+def test_timeout_recovers_after_host_slows_down(monkeypatch):
+    monkeypatch.setattr(page_waits, "WAIT_MIN_TIMEOUT_SEC", 0.01)
+    monkeypatch.setattr(page_waits, "WAIT_POLL_SEC", 0.001)
+    tracker = LatencyTracker()
+    key = "dexscreener.com/table"
+    for _ in range(50):
+        tracker.record(key, 0.002)           # learned on fast loads
+    assert tracker.timeout(key, max_timeout=1.0) == 0.01
+
+    # the host now takes 0.2s for good: early waits time out, but each timeout
+    # raises the p95 until the timeout covers the new load time again
+    results = []
+    for _ in range(30):
+        waiter = PageWaiter(SlowPage(0.2), "https://dexscreener.com/solana", tracker=tracker)
+        results.append(waiter.wait("table", selectors=["a"], max_timeout=1.0))
+        if results[-1]:
+            break
+    assert results[0] is False
+    assert results[-1] is True
+    assert tracker.timeout(key, max_timeout=1.0) > 0.2
+
+
+def test_budget_cut_wait_is_not_a_sample(monkeypatch):
+    monkeypatch.setattr(page_waits, "WAIT_POLL_SEC", 0.001)
+    tracker = LatencyTracker()
+    waiter = PageWaiter(SlowPage(10), "https://dexscreener.com/solana", budget=0.01, tracker=tracker)
+    assert waiter.wait("table", selectors=["a"], max_timeout=5) is False
+    assert tracker.p95("dexscreener.com/table") is None and not tracker._samples["dexscreener.com/table"]
@@ -0,0 +1,43 @@
+import os
+import time
+import signal
+import multiprocessing as mp
+import pytest
+
+import profiling
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="needs SIGUSR1")
+
+PROFILER = profiling.Profiler("test", cycles=0)
+
+
+def _wait_for_signal(q):
+    profiling.install_signal()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if PROFILER.armed:
+            q.put(os.getpid())
+            return
+        time.sleep(0.01)
+    q.put(None)
+
+
+def test_signal_is_forwarded_to_worker_processes():
+    ctx = mp.get_context("fork")
+    q, procs = ctx.Queue(), []
+    profiling.install_signal(forward_to=lambda: [p.pid for p in procs])
+    try:
+        procs += [ctx.Process(target=_wait_for_signal, args=(q,)) for _ in range(2)]
+        for p in procs:
+            p.start()
+        time.sleep(0.2)
+        os.kill(os.getpid(), signal.SIGUSR1)
+        armed = sorted(q.get(timeout=10) for _ in procs)
+        assert armed == sorted(p.pid for p in procs)
+        assert PROFILER.armed
+    finally:
+        for p in procs:
+            p.join(5)
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        profiling._FORWARD_TO = profiling._OWNER_PID = None
+        PROFILER._signalled = 0
@@ -0,0 +1,43 @@
+import time
+from scheduler import FairExecutor, FixedRateScheduler
+
+
+def _run(interval, durations):
+    starts = []
+    sched = FixedRateScheduler(interval)
+    t0 = time.monotonic()
+
+    def tick():
+        starts.append(time.monotonic() - t0)
+        time.sleep(durations[len(starts) - 1])
+
+    sched.run(tick, max_cycles=len(durations))
+    return starts, sched.stats
+
+
+def test_small_overrun_starts_next_cycle_immediately():
+    # the first cycle overruns its 0.2s slot by 0.05s: the second starts right
+    # after it instead of waiting for the slot at 0.4s
+    starts, stats = _run(0.2, [0.25, 0.0, 0.0])
+    assert starts[1] < 0.3
+    assert abs(starts[2] - 0.4) < 0.05      # back on the fixed grid
+    assert stats["missed"] == 0
+
+
+def test_fully_elapsed_slots_are_missed():
+    starts, stats = _run(0.2, [0.45, 0.0])
+    # slot 1 (0.2-0.4) passed entirely; slot 2 (0.4-0.6) starts at once
+    assert stats["missed"] == 1
+    assert 0.44 < starts[1] < 0.55
+
+
+def test_fair_executor_round_robins_keys():
+    ex = FairExecutor(1)
+    order = []
+    futures = [ex.submit("a", lambda i: (time.sleep(0.005), order.append(("a", i))), i) for i in range(4)]
+    futures += [ex.submit("b", lambda i: order.append(("b", i)), i) for i in range(2)]
+    for f in futures:
+        f.result()
+    ex.shutdown()
+    # "a" was queued first, but "b" is served on alternate picks
+    assert order.index(("b", 1)) < order.index(("a", 3))
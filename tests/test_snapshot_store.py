@@ -0,0 +1,113 @@
+import datetime as dt
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")    # fakeredis runs the commit script with it
+
+import event_bus
+import snapshot_codec
+from snapshot_store import SnapshotStore
+
+T0 = dt.datetime(2026, 1, 1, 12, 0, 0, tzinfo=dt.timezone.utc)
+
+
+def row(contract, rank, mc=1000.0):
+    return {"chain": "sol", "contract": contract, "name": contract.upper(), "symbol": contract[:3],
+            "rank": rank, "market_cap_raw": "", "liquidity_raw": "", "volume_raw": "",
+            "market_cap": mc, "liquidity": 50.0, "volume": 10.0,
+            "link": f"https://dexscreener.com/solana/{contract}", "thumbnail": ""}
+
+
+def window(contracts, mc=1000.0):
+    return [row(c, i + 1, mc) for i, c in enumerate(contracts)]
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture(params=["json", "msgpack"])
+def codec(request, monkeypatch):
+    if request.param == "msgpack":
+        pytest.importorskip("msgpack")
+    monkeypatch.setattr(snapshot_codec, "SNAPSHOT_CODEC", request.param)
+    return request.param
+
+
+def test_commit_load_roundtrip(r, codec):
+    store = SnapshotStore(r, keyframe_every=4, retain_sec=0)
+    names = [f"tok{i}" for i in range(20)]
+    written = {}
+    for v in range(1, 10):
+        order = names[:]
+        order[v], order[v + 1] = order[v + 1], order[v]       # one swap and one changed field per version
+        w = window(order)
+        w[0]["market_cap"] = 1000.0 + v
+        ver, events = store.commit(w, T0 + dt.timedelta(minutes=v), rank_move_threshold=1)
+        assert ver == v and events is not None
+        written[ver] = w
+
+    reader = SnapshotStore(r, retain_sec=0)   # no local cache: rebuilt from keyframe + deltas
+    for ver, w in written.items():
+        assert reader.load(ver) == w
+    assert reader.load_current() == (9, written[9])
+    assert r.zrange(store.k_keyframes, 0, -1) == ["1", "4", "8"]
+
+
+def test_unchanged_window_is_skipped(r):
+    store = SnapshotStore(r, retain_sec=0)
+    w = window(["a", "b", "c"])
+    assert store.commit(w, T0)[0] == 1
+    before = r.xlen(event_bus.EVENT_STREAM)
+    assert store.commit([dict(t) for t in w], T0 + dt.timedelta(minutes=1)) == (1, None)
+    assert store.latest_version() == 1
+    assert r.xlen(event_bus.EVENT_STREAM) == before
+    # save() always writes, and clears the fingerprint so the next commit is not skipped
+    assert store.save(w, T0 + dt.timedelta(minutes=2)) == 2
+    assert store.commit(w, T0 + dt.timedelta(minutes=3))[0] == 3
+
+
+def test_events_for_added_removed_and_moved(r):
+    store = SnapshotStore(r, retain_sec=0)
+    _, first = store.commit(window(["a", "b", "c"]), T0, rank_move_threshold=1)
+    assert [(e["change_type"], e["contract"]) for e in first] == [("ADDED", "a"), ("ADDED", "b"), ("ADDED", "c")]
+
+    ver, events = store.commit(window(["c", "a", "d"]), T0 + dt.timedelta(minutes=1), rank_move_threshold=1)
+    got = [(e["change_type"], e["contract"], e["old_rank"], e["new_rank"]) for e in events]
+    assert got == [("ADDED", "d", None, 3), ("REMOVED", "b", 2, None),
+                   ("MOVED", "c", 3, 1), ("MOVED", "a", 1, 2)]
+    assert all(e["window_version"] == ver == 2 and e["chain"] == "sol" for e in events)
+    assert events[0]["event_id"] == "sol:d:2:ADDED:None:3"
+    assert r.xlen(event_bus.EVENT_STREAM) == 3 + 4
+
+    # below the threshold a rank change is not an event
+    _, events = store.commit(window(["a", "c", "d"]), T0 + dt.timedelta(minutes=2), rank_move_threshold=5)
+    assert events == []
+
+
+def test_conflicting_writer_is_retried(r):
+    a, b = SnapshotStore(r, retain_sec=0), SnapshotStore(r, retain_sec=0)
+    a.commit(window(["a", "b"]), T0)
+    b.commit(window(["b", "c"]), T0 + dt.timedelta(minutes=1))      # a's base is now stale
+    ver, events = a.commit(window(["c", "d"]), T0 + dt.timedelta(minutes=2))
+    assert ver == 3
+    assert [(e["change_type"], e["contract"]) for e in events] == [("ADDED", "d"), ("REMOVED", "b")]
+    assert SnapshotStore(r).load(3) == window(["c", "d"])
+
+
+def test_prune_cuts_only_at_keyframes(r):
+    store = SnapshotStore(r, keyframe_every=3, retain_sec=0, retain_versions=4)
+    names = [f"tok{i}" for i in range(20)]
+    for v in range(1, 11):
+        store.commit(window(names, mc=1000.0 + v), T0 + dt.timedelta(minutes=v))
+    assert r.zrange(store.k_keyframes, 0, -1) == ["1", "3", "6", "9"]
+
+    # keep 4 versions -> 7..10, but 7 and 8 are deltas on keyframe 6, so 6 stays too
+    assert store.prune() == 5
+    assert [int(v) for v in r.zrange(store.k_versions, 0, -1)] == [6, 7, 8, 9, 10]
+    assert r.zrange(store.k_keyframes, 0, -1) == ["6", "9"]
+    reader = SnapshotStore(r, retain_sec=0)
+    assert reader.load(7) == window(names, mc=1007.0)
+    assert reader.load(5) == []
+    assert store.prune() == 0
@@ -0,0 +1,43 @@
+import time
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from token_cache import HIT, MISS, NEGATIVE, K_TOKEN, TokenCache
+
+
+@pytest.fixture
+def r():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def memory_ttl(cache, key):
+    expires, _ = cache.memory._data[key]
+    return expires - time.monotonic()
+
+
+def test_promotion_keeps_remaining_redis_ttl(r):
+    TokenCache(r=r, ttl=3600).put("AbC", {"name": "x"})
+    r.expire(K_TOKEN.format(addr="abc"), 20)
+
+    other = TokenCache(r=r, ttl=3600)   # another worker, empty memory tier
+    assert other.get("abc") == (HIT, {"name": "x"})
+    assert 15 < memory_ttl(other, "abc") <= 20
+
+    third = TokenCache(r=r, ttl=3600)
+    assert third.get_many(["ABC", "missing"]) == {"abc": (HIT, {"name": "x"}), "missing": (MISS, None)}
+    assert memory_ttl(third, "abc") <= 20
+
+
+def test_only_404_gets_the_long_negative_ttl(r):
+    cache = TokenCache(r=r, ttl=3600, negative_ttl=300, error_ttl=30)
+    cache.put_negative("gone", "Token not found", 404)
+    cache.put_negative("flaky", "Failed to scrape token data", 500)
+
+    assert r.ttl(K_TOKEN.format(addr="gone")) == 300
+    assert r.ttl(K_TOKEN.format(addr="flaky")) == 30
+    assert cache.get("flaky") == (NEGATIVE, {"error": "Failed to scrape token data", "status": 500})
+
+    other = TokenCache(r=r, ttl=3600, negative_ttl=300, error_ttl=30)
+    other.get("flaky")
+    assert memory_ttl(other, "flaky") <= 30
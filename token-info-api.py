@@ -1,12 +1,21 @@
 import os
 import json
+import time
 import mysql.connector
+import redis
 import re
-from flask import Flask, jsonify
-from seleniumbase import SB
-import urllib.parse
+from flask import Flask, Response, g, jsonify, request
+from browser_pool import BrowserPool
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
+from db_pool import DBPool
+from extractors import extract_token_info, record_html
+from page_waits import PageWaiter
+from token_cache import TokenCache, TOKEN_CACHE_REDIS, HIT, NEGATIVE
+from scrape_jobs import ScrapeJobs, JobQueueFull
+from token_prefetch import Prefetcher, TOKEN_PREFETCH
+from token_store import TOKENS_TABLE, ensure_schema
+import metrics
+from metrics import get_logger
 
 load_dotenv()
 
@@ -18,157 +27,287 @@ db_url = os.getenv("DB_URL")  # Set this in your .env file
 if not db_url:
     raise RuntimeError("DB_URL environment variable is required")
 
-url = urllib.parse.urlparse(db_url)
+# tables are always schema-qualified (token_store.TOKENS_TABLE), so no per-request USE is needed
+TOKENS_CHAIN = "sol"   # the API looks up and scrapes Solana tokens; rows are keyed by (chain, contract)
 
-sqldb = mysql.connector.connect(
-    host=url.hostname,
-    port=url.port,
-    user=url.username,
-    password=url.password,
-    database=url.path.lstrip("/"),
-    ssl_disabled=False,
-    autocommit=True
-)
+# per-process connection pool (DB_POOL_SIZE), health-checked on every checkout
+DB = DBPool(db_url, on_create=ensure_schema)
 
 HEADLESS = os.getenv("HEADLESS", "1") == "1"
+# 1 = a cache miss answers 202 with a job id instead of waiting for the scrape (per request: ?async=0/1)
+SCRAPE_ASYNC = os.getenv("SCRAPE_ASYNC", "0") == "1"
+TOKENS_BATCH_MAX = int(os.getenv("TOKENS_BATCH_MAX", "500"))              # addresses per POST /tokens
+TOKENS_BATCH_WAIT_SEC = float(os.getenv("TOKENS_BATCH_WAIT_SEC", "30"))   # then unfinished scrapes are "pending"
 
-def dprint(message):
-    print(f"API:: {message}")
+# warm Chrome sessions leased per cache miss (size via BROWSER_POOL_SIZE)
+BROWSER_POOL = BrowserPool(warm_url="https://dexscreener.com/solana", headless=HEADLESS)
+
+# memory LRU (+ shared Redis tier with TOKEN_CACHE_REDIS=1) in front of MySQL and the scraper
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+r = redis.from_url(REDIS_URL, decode_responses=True) if (TOKEN_CACHE_REDIS or TOKEN_PREFETCH) else None
+# prefetch warms whichever worker reads an event, so it needs the shared tier to reach the rest
+TOKEN_CACHE = TokenCache(r=r if (TOKEN_CACHE_REDIS or TOKEN_PREFETCH) else None)
+
+log = get_logger("api")
+dprint = log.debug
+
+REQUEST_SECONDS = metrics.histogram("api_request_seconds", "Request latency by route and status", ("route", "status"))
+ROWS_WRITTEN = metrics.counter("rows_written_total", "Rows upserted into MySQL", ("table",), rate=True)
 
 def scrape_token_info(addr: str) -> dict:
-    with SB(uc=True, test=True, locale_code="en", headless=HEADLESS) as sb:
+    with BROWSER_POOL.lease() as br:
+        sb = br.sb
+        waiter = PageWaiter(sb, addr, kind="token_info")
         dprint(f"Navigate: {addr}")
-        sb.activate_cdp_mode(addr)
-        sb.sleep(1)
-        try: sb.uc_gui_click_captcha()
-        except Exception as e: dprint(f"Captcha not present/ignored: {e}")
-        sb.sleep(1)
-        html = sb.get_page_source()
-
-    soup = BeautifulSoup(html, "html.parser")
-    
-    # Find the logo image URL using BeautifulSoup
-    logo_img = soup.find('img', src=re.compile(r'cdn\.dexscreener\.com/cms/images/'))
-    logo_url = logo_img['src'] if logo_img else None
-    
-    # Extract token name (prefer header structure)
-    # 1) Look inside <header> that has (itself or descendants) class 'chakra-stack'
-    #    and contains h2.chakra-heading.
-    header_candidates = []
-    for hdr in soup.find_all('header'):
-        has_stack = ('chakra-stack' in (hdr.get('class') or [])) or bool(hdr.find(class_='chakra-stack'))
-        if not has_stack:
-            continue
-        h2 = hdr.find('h2', class_='chakra-heading')
-        if not h2:
-            continue
-        span = h2.find('span')
-        text = (span.get_text(strip=True) if span else h2.get_text(strip=True))
-        if text and 1 <= len(text) <= 120:
-            header_candidates.append((hdr, h2, text))
+        with waiter.stage("navigate"):
+            br.open(addr)
+        # challenge cleared + network quiet; a missing token page still returns what it has
+        waiter.wait("page", network_idle=True, max_timeout=15)
+        with waiter.stage("page_source"):
+            html = sb.get_page_source()
+        dprint(waiter.summary())
 
-    if not header_candidates:
-        dprint("Name pattern debug (header): No <header> with chakra-stack and h2.chakra-heading found")
-    else:
-        dprint(f"Name pattern debug (header): Found {len(header_candidates)} candidates")
-        for idx, (_, _, txt) in enumerate(header_candidates):
-            dprint(f"  [H{idx}] {txt}")
-
-    # Extract token symbol (prefer element structure)
-    # 1) Look inside <div> that has (itself or descendants) class 'chakra-stack'
-    #    and contains h2.chakra-heading. 
-    #  h2 contains span with symbol text.
-    symbol_candidates = []
-    for div in soup.find_all('div'):
-        has_stack = ('chakra-stack' in (div.get('class') or [])) or bool(div.find(class_='chakra-stack'))
-        if not has_stack:
-            continue
-        h2 = div.find('h2', class_='chakra-heading')
-        if not h2:
-            continue
-        span = h2.find('span')
-        text = (span.get_text(strip=True) if span else h2.get_text(strip=True))
-        if text and 1 <= len(text) <= 20:
-            symbol_candidates.append((div, h2, text))
+    record_html("token", html)
+    with waiter.stage("parse"):
+        return extract_token_info(html, addr, log=dprint)
 
-    if not symbol_candidates:
-        dprint("Symbol pattern debug (div): No <div> with chakra-stack and h2.chakra-heading found")
-    else:
-        dprint(f"Symbol pattern debug (div): Found {len(symbol_candidates)} candidates")
-        for idx, (_, _, txt) in enumerate(symbol_candidates):
-            dprint(f"  [S{idx}] {txt}")
-    
-    token_data = {
-        # store the contract address in simple letter form
-        'contract': addr.split('/')[-1].lower(),
-        'name': header_candidates[0][2] if header_candidates else None,
-        'symbol': symbol_candidates[0][2] if symbol_candidates else None,
-        'logo_url': logo_url
+def _token_from_row(result: dict) -> dict:
+    return {
+        'contract': result['contract'],
+        'logo_url': result['thumbnail'],
+        'name': result['name'],
+        'symbol': result['symbol']
     }
 
-    return token_data
+def lookup_db(token_address: str):
+    t0 = time.perf_counter()
+    with DB.cursor(dictionary=True, buffered=True) as cursor:
+        cursor.execute(f"SELECT * FROM {TOKENS_TABLE} WHERE chain = %s AND contract = %s",
+                       (TOKENS_CHAIN, token_address))
+        result = cursor.fetchone()
+    TOKEN_CACHE.stats.record("db", result is not None, time.perf_counter() - t0)
+    return _token_from_row(result) if result else None
+
+def lookup_db_many(token_addresses: list) -> dict:
+    """One IN (...) query for many addresses; returns {lower-cased contract: token data}."""
+    if not token_addresses:
+        return {}
+    t0 = time.perf_counter()
+    placeholders = ", ".join(["%s"] * len(token_addresses))
+    with DB.cursor(dictionary=True, buffered=True) as cursor:
+        cursor.execute(f"SELECT * FROM {TOKENS_TABLE} WHERE chain = %s AND contract IN ({placeholders})",
+                       (TOKENS_CHAIN, *token_addresses))
+        rows = cursor.fetchall()
+    found = {row['contract'].lower(): _token_from_row(row) for row in rows}
+    per_addr = (time.perf_counter() - t0) / len(token_addresses)
+    for addr in token_addresses:
+        TOKEN_CACHE.stats.record("db", TOKEN_CACHE.key(addr) in found, per_addr)
+    return found
+
+def scrape_and_store(token_address: str):
+    """Scrape a token page and insert it; returns (token data, None) or (None, (error, status))."""
+    addr = f"https://dexscreener.com/solana/{token_address}"
+    t0 = time.perf_counter()
+    try:
+        token_data = scrape_token_info(addr)
+    except Exception as e:
+        log.error(f"Scrape failed for {token_address}: {e}")
+        token_data = None
+    found = bool(token_data and (token_data['name'] or token_data['symbol']))
+    TOKEN_CACHE.stats.record("scrape", found, time.perf_counter() - t0)
+
+    if token_data is None:
+        return None, ("Failed to scrape token data", 500)
+    if not found:
+        # no token header on the page: unknown/invalid address, don't store an empty row
+        return None, ("Token not found", 404)
+
+    # Insert into DB (autocommit)
+    with metrics.stage("mysql"), DB.cursor(buffered=True) as cursor:
+        cursor.execute(f"""
+            INSERT INTO {TOKENS_TABLE} (chain, contract, name, symbol, thumbnail)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                name = VALUES(name),
+                symbol = VALUES(symbol),
+                thumbnail = VALUES(thumbnail)
+        """, (TOKENS_CHAIN, token_data['contract'], token_data['name'], token_data['symbol'], token_data['logo_url']))
+    ROWS_WRITTEN.inc(table="tokens")
+    return token_data, None
+
+def _scrape_job(token_address: str):
+    """Runs once per address at a time on the scrape pool; every waiter gets the same result."""
+    token_data, error = scrape_and_store(token_address)
+    if error:
+        TOKEN_CACHE.put_negative(token_address, *error)
+    else:
+        TOKEN_CACHE.put(token_address, token_data)
+    return token_data, error
+
+# concurrent misses for one address share a job; at most SCRAPE_WORKERS scrapes run at once
+SCRAPE_JOBS = ScrapeJobs(_scrape_job)
+
+# TOKEN_PREFETCH=1: warm the cache for tokens the trending extractor reports as ADDED
+PREFETCHER = Prefetcher(r, lookup_db_many, TOKEN_CACHE, SCRAPE_JOBS) if TOKEN_PREFETCH else None
+
+@app.before_request
+def _start_prefetcher():
+    # gunicorn workers start it at boot (gunicorn.conf.py) and __main__ does for the
+    # dev server; this covers other WSGI servers, from the first request on
+    if PREFETCHER is not None:
+        PREFETCHER.start()
+    g.started = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    started = g.get("started")
+    if started is not None and request.url_rule is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=request.url_rule.rule, status=response.status_code)
+    return response
+
+def _job_response(job):
+    if not job.done:
+        body = job.to_dict()
+        body["poll"] = f"/jobs/{job.id}"
+        return jsonify(body), 202
+    try:
+        token_data, error = job.result()
+    except Exception as e:
+        return jsonify({"error": f"Scrape job failed: {e}"}), 500
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    return jsonify(token_data)
+
+def _wait_arg(default=None):
+    try:
+        return max(0.0, float(request.args["wait"]))
+    except (KeyError, ValueError):
+        return default
 
 @app.route('/token/<token_address>', methods=['GET'])
 def get_token_info(token_address: str):
+    with metrics.stage("cache"):
+        status, cached = TOKEN_CACHE.get(token_address)
+    if status == HIT:
+        return jsonify(cached)
+    if status == NEGATIVE:
+        # failed recently: don't hit the DB or start a browser again until the entry expires
+        return jsonify({"error": cached["error"]}), cached["status"]
+
     # Check if token exists in DB
-    cursor = sqldb.cursor(dictionary=True, buffered=True)
-    cursor.execute("USE solana_tokens")
-    cursor.execute("SELECT * FROM tokens WHERE contract = %s", (token_address,))
-    result = cursor.fetchone()
-    cursor.close()
-
-    if result:
-        token_data = {
-            'contract': result['contract'],
-            'logo_url': result['thumbnail'],
-            'name': result['name'],
-            'symbol': result['symbol']
-        }
+    with metrics.stage("db"):
+        token_data = lookup_db(token_address)
+    if token_data:
+        TOKEN_CACHE.put(token_address, token_data)
         return jsonify(token_data)
-    else:
-        # Scrape from dexscreener
-        addr = f"https://dexscreener.com/solana/{token_address}"
-        token_data = scrape_token_info(addr)
-        
-        if token_data:
-            # Insert into DB
-            cursor = sqldb.cursor(buffered=True)
-            cursor.execute("USE solana_tokens")
-            cursor.execute("""
-                INSERT INTO tokens (contract, name, symbol, thumbnail)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    name = VALUES(name),
-                    symbol = VALUES(symbol),
-                    thumbnail = VALUES(thumbnail)
-            """, (token_data['contract'], token_data['name'], token_data['symbol'], token_data['logo_url']))
-            sqldb.commit()
-            cursor.close()
-            return jsonify(token_data)
+
+    # Scrape from dexscreener (joining a scrape already running for this address)
+    try:
+        job = SCRAPE_JOBS.submit(TOKEN_CACHE.key(token_address), token_address)
+    except JobQueueFull as e:
+        return jsonify({"error": f"Too many pending scrapes: {e}"}), 503
+    run_async = request.args.get("async", "1" if SCRAPE_ASYNC else "0") == "1"
+    # async: wait at most ?wait= seconds (default 0) before answering 202; sync: wait for the result
+    with metrics.stage("scrape_wait"):
+        job.wait(_wait_arg(0.0) if run_async else None)
+    return _job_response(job)
+
+def _job_status(job) -> dict:
+    """Per-address entry of a POST /tokens response for a scrape job."""
+    if not job.done:
+        return {"status": "pending", "job_id": job.id, "poll": f"/jobs/{job.id}"}
+    try:
+        token_data, error = job.result()
+    except Exception as e:
+        return {"status": "error", "error": f"Scrape job failed: {e}"}
+    if error:
+        return {"status": "not_found" if error[1] == 404 else "error", "error": error[0]}
+    return {"status": "ok", "data": token_data}
+
+@app.route('/tokens', methods=['POST'])
+def get_tokens_batch():
+    """
+    Metadata for many tokens: {"addresses": [...]} (or a bare JSON list).
+    Cache hits and one IN (...) query resolve what is known; misses are scraped in
+    parallel on the scrape pool for up to ?wait= seconds (TOKENS_BATCH_WAIT_SEC).
+    Every address gets a status: ok | not_found | error | pending (poll its job).
+    """
+    body = request.get_json(silent=True)
+    addresses = body.get("addresses") if isinstance(body, dict) else body
+    if not isinstance(addresses, list) or not all(isinstance(a, str) and a.strip() for a in addresses):
+        return jsonify({"error": "Expected a JSON list of addresses or {\"addresses\": [...]}"}), 400
+    addresses = list(dict.fromkeys(a.strip() for a in addresses))
+    if len(addresses) > TOKENS_BATCH_MAX:
+        return jsonify({"error": f"At most {TOKENS_BATCH_MAX} addresses per request"}), 400
+
+    results = {}
+    cached = TOKEN_CACHE.get_many(addresses)
+    unresolved = []
+    for addr in addresses:
+        status, data = cached[TOKEN_CACHE.key(addr)]
+        if status == HIT:
+            results[addr] = {"status": "ok", "data": data}
+        elif status == NEGATIVE:
+            results[addr] = {"status": "not_found" if data["status"] == 404 else "error", "error": data["error"]}
         else:
-            return jsonify({"error": "Failed to scrape token data"}), 500
+            unresolved.append(addr)
+
+    found = lookup_db_many(unresolved)
+    jobs = {}
+    for addr in unresolved:
+        token_data = found.get(TOKEN_CACHE.key(addr))
+        if token_data:
+            TOKEN_CACHE.put(addr, token_data)
+            results[addr] = {"status": "ok", "data": token_data}
+            continue
+        try:
+            jobs[addr] = SCRAPE_JOBS.submit(TOKEN_CACHE.key(addr), addr)
+        except JobQueueFull as e:
+            results[addr] = {"status": "error", "error": f"Too many pending scrapes: {e}"}
+
+    deadline = time.monotonic() + _wait_arg(TOKENS_BATCH_WAIT_SEC)
+    for addr, job in jobs.items():
+        job.wait(max(0.0, deadline - time.monotonic()))
+        results[addr] = _job_status(job)
+
+    summary = {}
+    for entry in results.values():
+        summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+    return jsonify({"results": {addr: results[addr] for addr in addresses}, "summary": summary})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    """Poll a scrape job; ?wait=N blocks up to N seconds for it to finish."""
+    job = SCRAPE_JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    job.wait(_wait_arg(0.0))
+    return _job_response(job)
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Hit ratio and latency per tier (memory, redis, db, scrape), plus scrape job counters."""
+    return jsonify({"tiers": TOKEN_CACHE.stats.snapshot(), "memory_entries": len(TOKEN_CACHE.memory),
+                    "scrape_jobs": SCRAPE_JOBS.stats(),
+                    "prefetch": PREFETCHER.stats if PREFETCHER is not None else None})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text format; under gunicorn each worker reports its own counters."""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
-    # Use tokens table in solana_tokens DB
+    # development server; for production run several workers under gunicorn (see README)
     try:
-        sql_cursor = sqldb.cursor(buffered=True)
-        sql_cursor.execute("USE solana_tokens")
-        sql_cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tokens (
-                contract VARCHAR(64) PRIMARY KEY,
-                chain VARCHAR(10),
-                name VARCHAR(255),
-                symbol VARCHAR(50),
-                market_cap DOUBLE,
-                liquidity DOUBLE,
-                volume DOUBLE,
-                thumbnail VARCHAR(255)
-            )
-                    """)
-        sqldb.commit()
-        sql_cursor.close()
+        with DB.connection():
+            pass   # creates the pool and the tokens table
     except mysql.connector.Error as err:
-        print(f"Error initializing MySQL: {err}")
+        log.error(f"Error initializing MySQL: {err}")
         exit(1)
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    BROWSER_POOL.warm()
+    if PREFETCHER is not None:
+        PREFETCHER.start()
+
+    app.run(host='0.0.0.0', port=int(os.getenv("PORT", "5000")),
+            debug=os.getenv("FLASK_DEBUG", "0") == "1", threaded=True)
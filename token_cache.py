@@ -0,0 +1,234 @@
+# token_cache.py
+# Read-through cache tiers for token metadata: an in-process LRU and an optional
+# shared Redis layer, both with TTLs, plus negative entries for addresses whose
+# scrape failed. Per-tier hit ratio and latency are kept in TierStats.
+import os, json, time, threading
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+import metrics
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))   # in-process LRU size
+TOKEN_CACHE_TTL_SEC = int(os.getenv("TOKEN_CACHE_TTL_SEC", "3600"))            # 0 disables both tiers
+TOKEN_CACHE_NEGATIVE_TTL_SEC = int(os.getenv("TOKEN_CACHE_NEGATIVE_TTL_SEC", "300"))   # definitive 404s
+TOKEN_CACHE_ERROR_TTL_SEC = int(os.getenv("TOKEN_CACHE_ERROR_TTL_SEC", "30"))         # other failures (5xx)
+TOKEN_CACHE_REDIS = os.getenv("TOKEN_CACHE_REDIS", "0") == "1"                  # shared tier across workers
+TIER_SAMPLES = 1000                                                             # recent latencies per tier
+
+K_TOKEN = "token:info:{addr}"   # json, expires after TTL
+
+LOOKUP_SECONDS = metrics.histogram("cache_lookup_seconds", "Token lookup latency per tier", ("tier",))
+LOOKUPS = metrics.counter("cache_lookups_total", "Token lookups per tier and result", ("tier", "result"))
+
+HIT, NEGATIVE, MISS = "hit", "negative", "miss"
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry expiry."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value, ttl: Optional[int] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TierStats:
+    """Lookups, hits and recent latency per tier ("memory", "redis", "db", "scrape", ...), also exported to /metrics."""
+
+    def __init__(self, samples: int = TIER_SAMPLES):
+        self._counts = defaultdict(lambda: {"lookups": 0, "hits": 0})
+        self._latency = defaultdict(lambda: deque(maxlen=samples))
+        self._lock = threading.Lock()
+
+    def record(self, tier: str, hit: bool, seconds: float):
+        with self._lock:
+            c = self._counts[tier]
+            c["lookups"] += 1
+            c["hits"] += int(hit)
+            self._latency[tier].append(seconds)
+        LOOKUP_SECONDS.observe(seconds, tier=tier)
+        LOOKUPS.inc(tier=tier, result="hit" if hit else "miss")
+
+    def snapshot(self) -> Dict[str, Dict]:
+        out = {}
+        with self._lock:
+            for tier, c in self._counts.items():
+                lat = sorted(self._latency[tier])
+                out[tier] = {
+                    **c,
+                    "hit_ratio": c["hits"] / c["lookups"] if c["lookups"] else 0.0,
+                    "avg_ms": 1000 * sum(lat) / len(lat) if lat else 0.0,
+                    "p95_ms": 1000 * lat[min(len(lat) - 1, int(0.95 * len(lat)))] if lat else 0.0,
+                }
+        return out
+
+
+class TokenCache:
+    """
+    Memory LRU -> Redis (optional) in front of the DB/scrape path:
+
+        status, data = cache.get(addr)      # HIT / NEGATIVE / MISS
+        ...
+        cache.put(addr, data)               # or cache.put_negative(addr, "scrape failed")
+
+    Negative entries carry the failure reason and a shorter TTL: negative_ttl for a
+    404, error_ttl for anything else (a transient scrape failure). Entries promoted
+    from Redis keep the expiry they have left there.
+    """
+
+    def __init__(self, r=None, max_entries: int = TOKEN_CACHE_MAX_ENTRIES, ttl: int = TOKEN_CACHE_TTL_SEC,
+                 negative_ttl: int = TOKEN_CACHE_NEGATIVE_TTL_SEC, error_ttl: int = TOKEN_CACHE_ERROR_TTL_SEC,
+                 stats: Optional[TierStats] = None):
+        self.r = r
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.memory = LRUCache(max_entries, ttl)
+        self.stats = stats or TierStats()
+
+    @staticmethod
+    def key(addr: str) -> str:
+        # contracts are stored lower-cased (and MySQL compares them case-insensitively)
+        return addr.strip().lower()
+
+    @staticmethod
+    def _result(entry: Dict) -> Tuple[str, Dict]:
+        if "__negative__" in entry:
+            return NEGATIVE, {"error": entry["__negative__"], "status": entry.get("status", 500)}
+        return HIT, entry
+
+    def _ttl_for(self, entry: Dict) -> int:
+        if "__negative__" not in entry:
+            return self.ttl
+        return self.negative_ttl if entry.get("status") == 404 else self.error_ttl
+
+    def _fetch(self, keys: List[str]) -> List[Tuple[Optional[str], int]]:
+        """(raw value, remaining ms) per key from Redis, in one round trip."""
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            redis_key = K_TOKEN.format(addr=key)
+            pipe.get(redis_key)
+            pipe.pttl(redis_key)
+        res = pipe.execute()
+        return list(zip(res[0::2], res[1::2]))
+
+    def _promote(self, key: str, entry: Dict, pttl: int):
+        # copy into memory for at most what the shared entry has left, so an
+        # invalidation or expiry there is not outlived by a fresh local TTL
+        ttl = self._ttl_for(entry)
+        if pttl is not None and pttl >= 0:
+            ttl = min(ttl, pttl / 1000)
+        if ttl > 0:
+            self.memory.put(key, entry, ttl)
+
+    def get(self, addr: str) -> Tuple[str, Optional[Dict]]:
+        if self.ttl <= 0:
+            return MISS, None
+        key = self.key(addr)
+        t0 = time.perf_counter()
+        entry = self.memory.get(key)
+        self.stats.record("memory", entry is not None, time.perf_counter() - t0)
+        if entry is not None:
+            return self._result(entry)
+
+        if self.r is not None:
+            t0 = time.perf_counter()
+            try:
+                [(raw, pttl)] = self._fetch([key])
+                entry = json.loads(raw) if raw else None
+            except Exception:
+                entry = None    # a Redis outage degrades to the DB path
+            self.stats.record("redis", entry is not None, time.perf_counter() - t0)
+            if entry is not None:
+                self._promote(key, entry, pttl)
+                return self._result(entry)
+        return MISS, None
+
+    def get_many(self, addrs: List[str]) -> Dict[str, Tuple[str, Optional[Dict]]]:
+        """get() for many addresses (keyed by cache key), with one pipelined round trip for the Redis tier."""
+        keys = list(dict.fromkeys(self.key(a) for a in addrs))
+        if self.ttl <= 0:
+            return {k: (MISS, None) for k in keys}
+        out, remote = {}, []
+        for key in keys:
+            t0 = time.perf_counter()
+            entry = self.memory.get(key)
+            self.stats.record("memory", entry is not None, time.perf_counter() - t0)
+            if entry is not None:
+                out[key] = self._result(entry)
+            else:
+                remote.append(key)
+        if remote and self.r is not None:
+            t0 = time.perf_counter()
+            try:
+                fetched = self._fetch(remote)
+            except Exception:
+                fetched = [(None, None)] * len(remote)
+            per_key = (time.perf_counter() - t0) / len(remote)
+            for key, (raw, pttl) in zip(remote, fetched):
+                try:
+                    entry = json.loads(raw) if raw else None
+                except ValueError:
+                    entry = None
+                self.stats.record("redis", entry is not None, per_key)
+                if entry is not None:
+                    self._promote(key, entry, pttl)
+                    out[key] = self._result(entry)
+        for key in keys:
+            out.setdefault(key, (MISS, None))
+        return out
+
+    def _store(self, key: str, entry: Dict, ttl: int):
+        if ttl <= 0:
+            return
+        self.memory.put(key, entry, ttl)
+        if self.r is not None:
+            try:
+                self.r.set(K_TOKEN.format(addr=key), json.dumps(entry), ex=ttl)
+            except Exception:
+                pass
+
+    def put(self, addr: str, data: Dict):
+        if self.ttl > 0:
+            self._store(self.key(addr), data, self.ttl)
+
+    def put_negative(self, addr: str, reason: str, status: int = 500):
+        """Cache a failure: a 404 for negative_ttl, anything else only for error_ttl."""
+        if self.ttl > 0:
+            entry = {"__negative__": reason, "status": status}
+            self._store(self.key(addr), entry, self._ttl_for(entry))
+
+    def invalidate(self, addr: str):
+        key = self.key(addr)
+        self.memory.discard(key)
+        if self.r is not None:
+            try:
+                self.r.delete(K_TOKEN.format(addr=key))
+            except Exception:
+                pass
@@ -0,0 +1,123 @@
+# token_prefetch.py
+# Background warm-up for token-info-api: consume ADDED events from the
+# token_changed stream, fill the cache from rows the trending extractor already
+# wrote, and queue scrapes only for tokens whose name/symbol/logo is missing.
+import os, atexit, socket, threading, time
+from typing import Callable, Dict, List
+from event_bus import EventConsumer
+from token_cache import HIT, NEGATIVE
+from metrics import get_logger
+
+TOKEN_PREFETCH = os.getenv("TOKEN_PREFETCH", "0") == "1"
+TOKEN_PREFETCH_GROUP = os.getenv("TOKEN_PREFETCH_GROUP", "token-api")
+TOKEN_PREFETCH_CHAIN = os.getenv("TOKEN_PREFETCH_CHAIN", "sol")          # the API scrapes Solana pages
+TOKEN_PREFETCH_MAX_PENDING = int(os.getenv("TOKEN_PREFETCH_MAX_PENDING", "20"))  # leave room for user misses
+TOKEN_PREFETCH_BATCH = 100
+REQUIRED_FIELDS = ("name", "symbol", "logo_url")
+
+log = get_logger("prefetch")
+dprint = log.debug
+
+
+class Prefetcher:
+    """
+        prefetcher = Prefetcher(r, lookup_db_many, TOKEN_CACHE, SCRAPE_JOBS)
+        prefetcher.start()
+
+    `lookup_many(addrs)` returns {cache key: token data} from the tokens table;
+    scrapes go through `jobs` (single-flight, bounded), which store and cache them.
+    """
+
+    def __init__(self, r, lookup_many: Callable[[List[str]], Dict[str, Dict]], cache, jobs,
+                 group: str = TOKEN_PREFETCH_GROUP, chain: str = TOKEN_PREFETCH_CHAIN,
+                 max_pending: int = TOKEN_PREFETCH_MAX_PENDING):
+        self.r = r
+        self.lookup_many = lookup_many
+        self.cache = cache
+        self.jobs = jobs
+        self.group = group
+        self.chain = chain
+        self.max_pending = max_pending
+        self.stats = {"events": 0, "warmed": 0, "scrapes": 0, "skipped": 0}
+        self._thread = None
+        self._consumer = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the consumer thread once per process."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # one consumer per API process, named by pid; removed again on exit so
+            # restarted workers don't leave dead consumers behind in the group
+            self._consumer = EventConsumer(self.r, self.group, consumer=f"{socket.gethostname()}-{os.getpid()}")
+            self._thread = threading.Thread(target=self._run, args=(self._consumer,), name="prefetch", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the consumer thread and delete the consumer from the group."""
+        with self._lock:
+            thread, consumer, self._thread = self._thread, self._consumer, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)     # a blocked read returns within its block time
+        consumer.close()
+
+    def _run(self, consumer: EventConsumer):
+        while not self._stop.is_set():
+            try:
+                entries = consumer.read(count=TOKEN_PREFETCH_BATCH)
+            except Exception as e:
+                log.error(f"Error reading events: {e}")
+                time.sleep(5)
+                continue
+            if not entries:
+                continue
+            # the group hands each event to one process only: the shared Redis cache
+            # tier is what makes a warm-up visible to the other workers
+            contracts = [event["contract"] for _, event in entries
+                         if event.get("change_type") == "ADDED" and event.get("chain", self.chain) == self.chain]
+            try:
+                self.handle(contracts)
+            except Exception as e:
+                log.error(f"Error prefetching {len(contracts)} tokens: {e}")
+            # best effort: a lost warm-up only costs the first user request a scrape
+            consumer.ack(*[entry_id for entry_id, _ in entries])
+
+    def handle(self, contracts: List[str]):
+        contracts = list(dict.fromkeys(contracts))
+        self.stats["events"] += len(contracts)
+        if not contracts:
+            return
+        cached = self.cache.get_many(contracts)
+        todo = []
+        for addr in contracts:
+            status, _ = cached[self.cache.key(addr)]
+            if status == HIT:
+                continue
+            if status == NEGATIVE:
+                # requested before it was trending; it exists now
+                self.cache.invalidate(addr)
+            todo.append(addr)
+
+        rows = self.lookup_many(todo)
+        for addr in todo:
+            data = rows.get(self.cache.key(addr))
+            if data and all(data.get(f) for f in REQUIRED_FIELDS):
+                self.cache.put(addr, data)
+                self.stats["warmed"] += 1
+                continue
+            # missing row or incomplete fields: scrape, unless user misses already fill the pool
+            if self.jobs.stats()["pending"] >= self.max_pending:
+                self.stats["skipped"] += 1
+                continue
+            try:
+                self.jobs.submit(self.cache.key(addr), addr)
+                self.stats["scrapes"] += 1
+            except Exception as e:
+                dprint(f"Could not queue scrape for {addr}: {e}")
+                self.stats["skipped"] += 1
+        dprint(f"Prefetched {len(contracts)} ADDED tokens: {self.stats}")
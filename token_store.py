@@ -0,0 +1,67 @@
+# token_store.py
+# Schema of the tokens table, shared by the trending extractor (upserts every
+# chain's window) and token-info-api (reads it, inserts scraped Solana tokens).
+# Rows are keyed by (chain, contract): EVM chains share the 0x address space,
+# so the same pair address or pool id can appear on two chains.
+from metrics import get_logger
+
+TOKENS_SCHEMA = "solana_tokens"
+TOKENS_TABLE = f"{TOKENS_SCHEMA}.tokens"
+CONTRACT_LEN = 66   # EVM pair address (0x + 40 hex) or Uniswap v4 pool id (0x + 64 hex)
+LEGACY_CHAIN = "sol"   # chain of rows written before the column was filled in (API inserts)
+
+log = get_logger("store")
+
+TOKENS_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {TOKENS_TABLE} (
+        contract VARCHAR({CONTRACT_LEN}) NOT NULL,
+        chain VARCHAR(10) NOT NULL,
+        name VARCHAR(255),
+        symbol VARCHAR(50),
+        market_cap DOUBLE,
+        liquidity DOUBLE,
+        volume DOUBLE,
+        thumbnail VARCHAR(255),
+        PRIMARY KEY (chain, contract)
+    )
+"""
+
+
+def ensure_schema(conn):
+    """
+    Create the tokens table, or migrate an older one: widen contract to
+    CONTRACT_LEN and re-key it from contract alone to (chain, contract).
+    """
+    cur = conn.cursor()
+    cur.execute(f"CREATE DATABASE IF NOT EXISTS {TOKENS_SCHEMA}")
+    cur.execute(TOKENS_DDL)
+
+    cur.execute("""
+        SELECT CHARACTER_MAXIMUM_LENGTH FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'tokens' AND COLUMN_NAME = 'contract'
+    """, (TOKENS_SCHEMA,))
+    row = cur.fetchone()
+    if row and row[0] is not None and row[0] < CONTRACT_LEN:
+        cur.execute(f"ALTER TABLE {TOKENS_TABLE} MODIFY contract VARCHAR({CONTRACT_LEN}) NOT NULL")
+
+    cur.execute("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'tokens' AND CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY ORDINAL_POSITION
+    """, (TOKENS_SCHEMA,))
+    pk = [row[0] for row in cur.fetchall()]
+    if pk != ["chain", "contract"]:
+        # the old key was contract alone, so no two rows can collide on (chain, contract)
+        cur.execute(f"UPDATE {TOKENS_TABLE} SET chain = %s WHERE chain IS NULL", (LEGACY_CHAIN,))
+        if cur.rowcount:
+            log.warning(f"tokens migration: set chain={LEGACY_CHAIN!r} on {cur.rowcount} row(s) without a chain")
+        cur.execute(f"""
+            ALTER TABLE {TOKENS_TABLE}
+                MODIFY chain VARCHAR(10) NOT NULL,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (chain, contract)
+        """)
+        log.info("tokens migration: primary key is now (chain, contract)")
+
+    conn.commit()
+    cur.close()
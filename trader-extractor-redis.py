@@ -1,13 +1,27 @@
 #  redis-server --daemonize yes
 import os
+import sys
 import json
+import time
+import queue
+import signal
 import threading
+import multiprocessing as mp
 import mysql.connector
 import redis
 import re
 from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
-from seleniumbase import SB
+from extractors import extract_top_trader_wallets, extract_wallet_metrics, record_html
+from cdp_capture import NetworkCapture, decode_wallet_metrics, network_mode
+from page_waits import PageWaiter
+from event_bus import EventConsumer
+from browser_pool import BrowserPool, POOL_SIZE as BROWSER_POOL_SIZE
+from wallet_cache import WalletCache
+from trader_store import TraderBuffer, ensure_schema
+from snapshot_store import SnapshotStore
+import metrics
+from metrics import get_logger
+from profiling import Profiler, install_signal
 import urllib.parse
 
 DB_WRITE = True  # Set to False to disable DB writes (for testing)
@@ -19,14 +33,31 @@ if not db_url:
 
 url = urllib.parse.urlparse(db_url)
 
-sqldb = mysql.connector.connect(
-    host=url.hostname,
-    port=url.port,
-    user=url.username,
-    password=url.password,
-    database=url.path.lstrip("/"),
-    ssl_disabled=False
-)
+def _connect_db():
+    return mysql.connector.connect(
+        host=url.hostname,
+        port=url.port,
+        user=url.username,
+        password=url.password,
+        database=url.path.lstrip("/"),
+        ssl_disabled=False
+    )
+
+sqldb = _connect_db()
+
+# one connection per worker thread/process; mysql connections are not thread-safe
+_db_local = threading.local()
+
+def get_db():
+    conn = getattr(_db_local, "conn", None)
+    if conn is None or getattr(_db_local, "pid", None) != os.getpid():
+        conn = _connect_db()
+        cur = conn.cursor()
+        cur.execute("USE solana_tokens")
+        cur.close()
+        _db_local.conn = conn
+        _db_local.pid = os.getpid()
+    return conn
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 # DB_CFG = {
@@ -36,16 +67,36 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 #     "password": os.getenv("MYSQL_PASS", "1234"),
 #     "database": os.getenv("MYSQL_DB", "solana_tokens"),
 # }
-EVENT_CHANNEL = "token_changed"
+EVENT_GROUP = os.getenv("TRADER_EVENT_GROUP", "trader")  # consumer group on the token_changed stream
 DEDUPE_SET = "processed_event_ids"  # Redis set for idempotency
 DEDUPE_TTL = 600  # seconds
 
-K_CUR = "trending:window:current"            # JSON array (latest-only snapshot)
+# XHR hosts carrying wallet-analyzer stats (CAPTURE_MODE=network)
+WALLET_CAPTURE_PATTERNS = ["dexcheck.ai/api", "api.dexcheck.ai"]
+
+# incremental extraction
+TRADER_MODE = os.getenv("TRADER_MODE", "incremental")              # incremental | full
+TRADER_STALE_SEC = int(os.getenv("TRADER_STALE_SEC", "21600"))     # re-extract a token after this long
+TRADER_STALE_SCAN_SEC = int(os.getenv("TRADER_STALE_SCAN_SEC", "900"))  # how often to sweep the snapshot
+K_CHECKPOINT = "trader:checkpoint"     # hash contract -> {"extracted_at", "window_version"}
+
+# worker pool
+TRADER_WORKERS = int(os.getenv("TRADER_WORKERS", "1"))
+TRADER_WORKER_MODE = os.getenv("TRADER_WORKER_MODE", "thread")  # thread | process
+TRADER_QUEUE_SIZE = int(os.getenv("TRADER_QUEUE_SIZE", "20"))   # bounded -> submit() blocks when full
+TRADER_REPORT_SEC = int(os.getenv("TRADER_REPORT_SEC", "60"))
+
 K_LATEST_VER = "trending:latest_version"     # string int
-K_WINDOW_VER = "trending:window:{ver}"       # JSON array by version
+CHAIN = "sol"   # trader pages are Solana-only; other chains' events on the shared stream are skipped
 
 r = redis.from_url(REDIS_URL, decode_responses=True)
 
+# trending windows written by the trending extractor (read-only here)
+SNAPSHOTS = SnapshotStore(r, prefix="trending")
+
+# wallet metrics cached in Redis, shared by all workers (WALLET_CACHE_TTL_SEC=0 disables)
+WALLET_CACHE = WalletCache(r)
+
 # sqldb = mysql.connector.connect(
 #     host=DB_CFG["host"],
 #     port=DB_CFG["port"],
@@ -57,214 +108,226 @@ r = redis.from_url(REDIS_URL, decode_responses=True)
 
 sql_cursor = sqldb.cursor()
 
-DEBUG_PRINT = True  # Set to True for debugging output
-def dprint(message):
-    if DEBUG_PRINT:
-        thread = threading.current_thread()
-        thread_info = f"tid-{thread.ident}"
-        print(f"{thread_info}:: {message}")
+# warm Chrome sessions shared by every token we process
+# (thread mode needs one browser per worker; process mode gets one pool per process)
+BROWSER_POOL = BrowserPool(
+    size=max(BROWSER_POOL_SIZE, TRADER_WORKERS) if TRADER_WORKER_MODE == "thread" else BROWSER_POOL_SIZE,
+    warm_url="https://dexscreener.com/solana", headless=True
+)
 
-def load_current_snapshot() -> List[Dict]:
-    """Load the latest snapshot (supports both single 'current' and versioned)."""
-    while(1):
-        v = r.get(K_LATEST_VER)
-        if v:
-            raw = r.get(K_WINDOW_VER.format(ver=int(v)))
+log = get_logger("trader")
+dprint = log.debug
+
+WALLETS = metrics.counter("wallets_total", "Wallets processed by source (cache, scrape, error)", ("source",), rate=True)
+ROWS_WRITTEN = metrics.counter("rows_written_total", "Rows upserted into MySQL", ("table",), rate=True)
+TOKENS = metrics.counter("tokens_processed_total", "Tokens processed by the workers", ("result",), rate=True)
+
+# PROFILE_CYCLES=N / SIGUSR1: profile the next N tokens (per worker process in process mode)
+PROFILER = Profiler("trader")
+
+def get_latest_version() -> int:
+    v = r.get(K_LATEST_VER)
+    return int(v) if v else 0
+
+# ----------------------------
+# Checkpoints
+# ----------------------------
+class Checkpoints:
+    """
+    Per-token "last extracted at / window version" in Redis, plus the tokens queued
+    right now and the callbacks waiting for each of them to finish.
+    """
+
+    def __init__(self, stale_sec: int = TRADER_STALE_SEC):
+        self.stale_sec = stale_sec
+        self._queued: Dict[str, List] = {}   # contract -> on_done(ok) callbacks of its extraction
+        self._lock = threading.Lock()
+
+    def stale(self, contracts: List[str]) -> List[str]:
+        """The contracts never extracted, or extracted more than stale_sec ago."""
+        if not contracts:
+            return []
+        now = time.time()
+        out = []
+        for contract, raw in zip(contracts, r.hmget(K_CHECKPOINT, contracts)):
             if raw:
                 try:
-                    # display the info of the snapshot -> version, no. of tokens
-                    snapshot = json.loads(raw)
-                    dprint(f"Loaded snapshot for version {v} and no. of the tokens: {len(snapshot)}")
-                    return snapshot
-                
-                except Exception:
-                    dprint(f"Error loading snapshot for version {v}: {raw}")
-                    continue
-        else:
-            dprint(f"No version found")
+                    if now - json.loads(raw)["extracted_at"] < self.stale_sec:
+                        continue
+                except (ValueError, KeyError):
+                    pass
+            out.append(contract)
+        return out
+
+    def claim(self, contract: str, on_done=None) -> bool:
+        """
+        True if the caller should queue the contract. If it is already queued,
+        on_done is attached to that extraction instead and False is returned.
+        """
+        with self._lock:
+            waiters = self._queued.get(contract)
+            new = waiters is None
+            if new:
+                waiters = self._queued[contract] = []
+            if on_done is not None:
+                waiters.append(on_done)
+            return new
+
+    def done(self, contract: str, ok: bool, window_version: int):
+        with self._lock:
+            waiters = self._queued.pop(contract, [])
+        if ok:
+            r.hset(K_CHECKPOINT, contract, json.dumps({"extracted_at": time.time(), "window_version": window_version}))
+        for on_done in waiters:
+            try:
+                on_done(ok)
+            except Exception as e:
+                dprint(f"Completion callback failed for {contract}: {e}")
+
+def submit_tokens(engine, checkpoints: Checkpoints, contracts: List[str], window_version: int, on_done=None) -> int:
+    """
+    Queue the given contracts (full mode) or only the stale ones (incremental mode);
+    returns how many were queued. on_done(ok) runs once per contract: when its
+    extraction finishes (also one that was already queued), or right away with
+    True for a contract extracted within TRADER_STALE_SEC.
+    """
+    todo = checkpoints.stale(contracts) if TRADER_MODE == "incremental" else contracts
+    if on_done is not None:
+        for contract in set(contracts) - set(todo):
+            dprint(f"Skipping {contract}: extracted recently")
+            on_done(True)
+    n = 0
+    for contract in todo:
+        if not checkpoints.claim(contract, on_done):
+            if on_done is not None:
+                dprint(f"{contract} is already queued, waiting for that extraction")
             continue
+        engine.submit(contract, on_done=lambda ok, contract=contract: checkpoints.done(contract, ok, window_version))
+        n += 1
+    return n
 
-def parse_number(value_str):
-    if not value_str:
-        return None
-
-    value_str = value_str.replace(",", "").strip().replace("$", "").replace("%", "")
-    multiplier = 1.0
-
-    if value_str.endswith("K"):
-        multiplier = 1_000.0
-        value_str = value_str[:-1]
-    elif value_str.endswith("M"):
-        multiplier = 1_000_000.0
-        value_str = value_str[:-1]
-    elif value_str.endswith("B"):
-        multiplier = 1_000_000_000.0
-        value_str = value_str[:-1]
-
-    try:
-        return float(value_str) * multiplier
-    except ValueError:
-        return None
+def load_current_snapshot() -> List[Dict]:
+    """Load the latest snapshot, waiting until the trending extractor has written one."""
+    while(1):
+        try:
+            v, snapshot = SNAPSHOTS.load_current()
+        except Exception as e:
+            log.error(f"Error loading snapshot: {e}")
+            v, snapshot = 0, []
+        if snapshot:
+            # display the info of the snapshot -> version, no. of tokens
+            dprint(f"Loaded snapshot for version {v} and no. of the tokens: {len(snapshot)}")
+            return snapshot
+        dprint(f"No snapshot found (version {v})")
+        time.sleep(1)
+
+def _scrape_wallet_metrics(br, wallet_address: str) -> Dict:
+    """Open the dexcheck wallet analyzer for one wallet and parse its stats cards."""
+    sb = br.sb
+
+    # get the trader's gross profit, win rate, wins, losses, etc.
+    target_url = f"https://dexcheck.ai/app/wallet-analyzer/{wallet_address}"
+
+    waiter = PageWaiter(sb, target_url, kind="wallet")
+    if network_mode():
+        # decode the analyzer's own API responses; DOM parsing below is the fallback
+        with waiter.stage("capture"):
+            with NetworkCapture(br, WALLET_CAPTURE_PATTERNS) as cap:
+                br.open(target_url)
+                wallet = cap.wait_for(decode_wallet_metrics)
+        if wallet:
+            return wallet
+        dprint(f"No decodable wallet payload for {wallet_address}, falling back to DOM")
+    else:
+        with waiter.stage("navigate"):
+            br.open(target_url)
+
+    # poll for a cleared challenge and the stats cards instead of sleeping
+    if not waiter.wait("stats", selectors=['img.bg-brand-background-highlight'], max_timeout=50):
+        raise TimeoutError(f"Wallet stats not ready ({waiter.summary()})")
+
+    with waiter.stage("page_source"):
+        page_source = sb.get_page_source()
+    dprint(waiter.summary())
+    record_html("wallet", page_source)
+    with waiter.stage("parse"):
+        return extract_wallet_metrics(page_source)
 
 def _process_one_token(token_address: str):
     url = f"https://dexscreener.com/solana/{token_address}"
     try:
-        # Use SB context manager for automatic driver management and UC mode
-        # uc=True enables undetected-chromedriver features
-        # test=True can sometimes help with stability/configuration
-        # locale_code sets browser language, potentially aiding bypass
-        with SB(uc=True, test=True, locale_code="en", headless=True) as sb: # headless=True runs without visible browser
-
-            # activate_cdp_mode often used with uc=True for better interaction & navigation
-            sb.activate_cdp_mode(url)
-
-            # Short wait for the potential verification page to appear
-            sb.sleep(5)
-
-            # Attempt to click the Cloudflare checkbox IF it appears visually
-            # SeleniumBase tries to handle this automatically, but this adds robustness
-            try:
-                sb.uc_gui_click_captcha()
-            except Exception as captcha_click_error:
-                dprint(f"Captcha click failed or wasn't necessary: {captcha_click_error}")
-            
-            # wait until the class custom-1oq7u8k loads
-            try:
-                sb.wait_for_element_visible('div.custom-1oq7u8k', timeout=100)
-            except Exception as e:
-                dprint(f"Error waiting for class custom-1oq7u8k elements: {e}")
-                # exit if the elements are not found
-                return token_address
+        # Lease a warm UC-mode browser from the pool instead of launching Chrome per token;
+        # the first navigation on a fresh browser activates CDP mode
+        with BROWSER_POOL.lease() as br:
+            sb = br.sb
+            waiter = PageWaiter(sb, url, kind="token")
+            with waiter.stage("navigate"):
+                br.open(url)
+
+            # poll until the challenge (if any) is cleared and the pair page has rendered
+            if not waiter.wait("pair", selectors=['div.custom-1oq7u8k'], max_timeout=100):
+                log.error(f"Error waiting for class custom-1oq7u8k elements ({waiter.summary()})")
+                # exit if the elements are not found (not checkpointed, so it is retried)
+                return None
 
             # find the button with class 'custom-165cjlo' and click it
             try:
-                sb.click('button:contains("Top Traders")')
-                
+                with waiter.stage("click"):
+                    sb.click('button:contains("Top Traders")')
+
                 # wait until class_='custom-1hhf88o' loads
-                try:
-                    sb.wait_for_element_visible('a.custom-1hhf88o', timeout=100)
-                except Exception as e:
-                    dprint(f"Error waiting for trader address elements: {e}")
+                if not waiter.wait("top_traders", selectors=['a.custom-1hhf88o'], challenge=False, max_timeout=100):
+                    log.error(f"Error waiting for trader address elements ({waiter.summary()})")
                     # Consider adding sb.save_screenshot_to_logs() here too on error
-                    return token_address
+                    return None
 
                 # extract the html of the page after clicking the button
-                page_source = sb.get_page_source()
-                soup = BeautifulSoup(page_source, 'html.parser')
-                
-                # find all the a tag with class 'ds-dex-table-row-trader-address'
-                trader_address_tags = soup.find_all('a', class_='custom-1hhf88o')
-                
-                # loop through the tags and extract the href attribute
-                if len(trader_address_tags) >= 10:
-                    for tag in trader_address_tags[:10]:  # Limit to first 10 traders
-                        if tag and 'href' in tag.attrs:
-                            href = tag['href']
-                            # debug_print(f"Found href: {href}")
-                            # https://solscan.io/account/8Hw9X9UwBso7Sp2CFnEEeUGW8pGDj9wghc78ccWFZWpU get the last part of the href
-                            wallet_address = href.split('/')[-1]
-
-                            # # check wallet address already exists in the database, if yes -> skip
-                            # sql_cursor.execute("SELECT COUNT(*) FROM traders WHERE wallet_address = %s", (wallet_address,))
-                            # exists = sql_cursor.fetchone()[0] > 0
-
-                            # if exists:
-                            #     dprint(f"Wallet address {wallet_address} already exists in the database, skipping.")
-                            #     continue
-
-                            # get the trader's gross profit, win rate, wins, losses, etc.
-                            target_url = f"https://dexcheck.ai/app/wallet-analyzer/{wallet_address}"
-
-                            sb.open(target_url)
-
-                            # Short wait for the potential verification page to appear
-                            sb.sleep(2)
-
-                            # Attempt to click the Cloudflare checkbox IF it appears visually
-                            # SeleniumBase tries to handle this automatically, but this adds robustness
-                            try:
-                                sb.uc_gui_click_captcha()
-                            except Exception as captcha_click_error:
-                                dprint(f"Captcha click failed or wasn't necessary: {captcha_click_error}")
-
-                            # wait until the element <h3 class="text-sm text-white/70"> is visible
-                            sb.wait_for_element_visible('img.bg-brand-background-highlight', timeout=50)
-
-                            page_source = sb.get_page_source()
-
-                            soup = BeautifulSoup(page_source, 'html.parser')
-
-                            # --- Check if the wallet is bot? if bot the name is like this "Bot (gasTzr94Pmp4Gf8vknQnqxeYxdgwFjbgdJa4msYRpnB)"
-                            # begin with Bot 
-                            bot_tag = soup.find('span', string=re.compile(r"^Bot\s*\(", flags=re.I))
-
-                            # --- Gross Profit ---
-                            gross_profit = soup.find('h3', string=re.compile(r"Gross Profit", flags=re.I))
-                            if gross_profit:
-                                gross_profit_value = parse_number(gross_profit.find_next('p').text.strip())
-
-                            # -- Realized Profit ---
-                            realized_profit = soup.find('p', string=re.compile(r"Realized", flags=re.I))
-                            if realized_profit:
-                                realized_profit_str = realized_profit.find_next('p').text.strip()
-                                realized_profit_value = realized_profit_str.split(" ")[0].replace(",", "").replace("$", "")
-                                realized_profit_percent = realized_profit_str.split(" ")[1].replace("(", "").replace(")", "").replace("%", "")
-
-                            # --- Unrealized Profit ---
-                            unrealized_profit = soup.find('p', string=re.compile(r"Unrealized", flags=re.I))
-                            if unrealized_profit:
-                                unrealized_profit_str = unrealized_profit.find_next('p').text.strip()
-                                unrealized_profit_value = unrealized_profit_str.split(" ")[0].replace(",", "").replace("$", "")
-                                unrealized_profit_percent = unrealized_profit_str.split(" ")[1].replace("(", "").replace(")", "").replace("%", "")
-
-                            # --- Win Rate ---
-                            win_rate = soup.find('h3', string=re.compile(r"Win Rate", flags=re.I))
-                            if win_rate:
-                                win_rate_value = parse_number(win_rate.find_next('p').text.strip())
-
-                            # --- Wins and Losses ---
-                            win_count = soup.find('p', string=re.compile(r"Win", flags=re.I))
-                            if win_count:
-                                win_value = parse_number(win_count.find_next('p').text.strip())
-                            loss_count = soup.find('p', string=re.compile(r"Lose", flags=re.I))
-                            if loss_count:
-                                loss_value = parse_number(loss_count.find_next('p').text.strip())
-
-                            # --- Trade Volume, Trades, Avg Trade Size ---
-                            # Based on known layout order and heading structure
-                            trade_volume = soup.find('p', string=re.compile(r"Trading Volume", flags=re.I))
-                            if trade_volume:
-                                trade_volume_value = parse_number(trade_volume.find_next('p').text.strip())
-
-                            trades = soup.find('p', string=re.compile(r"Trades", flags=re.I))
-                            if trades:
-                                trades_value = parse_number(trades.find_next('p').text.strip())
-
-                            avg_trade_size = soup.find('p', string=re.compile(r"Avg. Trade Size", flags=re.I))
-                            if avg_trade_size:
-                                avg_trade_size_value = parse_number(avg_trade_size.find_next('p').text.strip())
-                            dprint(f"Is bot: {bot_tag is not None} "
+                with waiter.stage("page_source"):
+                    page_source = sb.get_page_source()
+                dprint(waiter.summary())
+                record_html("top_traders", page_source)
+                with waiter.stage("parse"):
+                    wallets = extract_top_trader_wallets(page_source)
+
+                # loop through the wallets of the top traders
+                if len(wallets) >= 10:
+                    # rows for this token are buffered and written with one upsert at the end
+                    buffer = TraderBuffer(token_address)
+                    for wallet_address in wallets[:10]:  # Limit to first 10 traders
+                        if wallet_address:
+
+                            # reuse metrics scraped recently (possibly under another token)
+                            with metrics.stage("wallet_cache"):
+                                wallet = WALLET_CACHE.get(wallet_address)
+                            if wallet is None:
+                                try:
+                                    with metrics.stage("wallet_scrape"):
+                                        wallet = _scrape_wallet_metrics(br, wallet_address)
+                                except Exception as e:
+                                    WALLETS.inc(source="error")
+                                    log.error(f"Error scraping wallet {wallet_address}: {e}")
+                                    continue
+                                WALLETS.inc(source="scrape")
+                                WALLET_CACHE.put(wallet_address, wallet)
+                            else:
+                                WALLETS.inc(source="cache")
+                                dprint(f"Wallet cache hit: {wallet_address}")
+
+                            dprint(f"Is bot: {wallet['is_bot']} "
                                 f"Wallet {wallet_address} token {token_address}: "
-                                f"Gross Profit: {gross_profit_value}, Win Rate: {win_rate_value}, "
-                                f"Realized Profit: {realized_profit_value}, Unrealized Profit: {unrealized_profit_value}, "
-                                f"Realized Profit (%): {realized_profit_percent}, Unrealized Profit (%): {unrealized_profit_percent}, "
-                                f"Wins: {win_value}, Losses: {loss_value}, Trading Volume: {trade_volume_value}, "
-                                f"Trades: {trades_value}, Avg. Trade Size: {avg_trade_size_value} \n")
-
-                            if DB_WRITE:
-                                # save to MySQL if already exists update the parameters
-                                sql_cursor.execute("""
-                                    INSERT INTO traders (wallet_address, token_address, gross_profit, realized_profit, 
-                                    realized_profit_percent, unrealized_profit, unrealized_profit_percent, win_rate, wins, losses, 
-                                    trade_volume, trades, avg_trade_size, is_bot)
-                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                    """, (wallet_address, token_address, gross_profit_value, realized_profit_value,
-                                          realized_profit_percent, unrealized_profit_value, unrealized_profit_percent, win_rate_value,
-                                          win_value, loss_value, trade_volume_value, trades_value, avg_trade_size_value,
-                                          bot_tag is not None))
-                                sqldb.commit()
-
-                                
+                                f"Gross Profit: {wallet['gross_profit']}, Win Rate: {wallet['win_rate']}, "
+                                f"Realized Profit: {wallet['realized_profit']}, Unrealized Profit: {wallet['unrealized_profit']}, "
+                                f"Realized Profit (%): {wallet['realized_profit_percent']}, Unrealized Profit (%): {wallet['unrealized_profit_percent']}, "
+                                f"Wins: {wallet['wins']}, Losses: {wallet['losses']}, Trading Volume: {wallet['trade_volume']}, "
+                                f"Trades: {wallet['trades']}, Avg. Trade Size: {wallet['avg_trade_size']} \n")
+
+                            buffer.add(wallet_address, wallet)
+
+                    if DB_WRITE:
+                        with metrics.stage("mysql"):
+                            n = buffer.flush(get_db())
+                        ROWS_WRITTEN.inc(n, table="traders")
+                        dprint(f"Upserted {n} traders for token {token_address}")
 
                     dprint(f"Extracted wallet data from {token_address}")
                     return token_address
@@ -273,13 +336,154 @@ def _process_one_token(token_address: str):
                     return token_address
                              
             except Exception as e:
-                dprint(f"Error clicking 'Top Traders' button: {e}")
+                log.error(f"Error clicking 'Top Traders' button: {e}")
 
     except Exception as e:
         dprint(f"An error occurred during SeleniumBase scraping: {e}")
         # Consider adding sb.save_screenshot_to_logs() here too on error
 
 
+# ----------------------------
+# Worker pool
+# ----------------------------
+def _worker_loop(worker_id: int, tasks, results, own_process: bool = False):
+    """
+    Pull (task id, token) pairs until a None sentinel arrives; report (worker, task,
+    seconds, ok, metrics) per token. Worker processes send what they recorded since
+    the last token, so the parent's /metrics covers them too, and close their own
+    browser pool on the way out (atexit does not run in a multiprocessing child).
+    """
+    if own_process:
+        metrics.REGISTRY.drain()   # values inherited from the parent at fork
+        install_signal()           # the parent forwards SIGUSR1 here (also under spawn/forkserver)
+        # daemon workers are terminated (SIGTERM) when the parent exits; unwind so Chrome is closed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                tasks.task_done()
+                break
+            task_id, token_address = task
+            t0 = time.monotonic()
+            ok = False
+            try:
+                with PROFILER.profile(), metrics.stage("token"):
+                    ok = _process_one_token(token_address) is not None
+            except Exception as e:
+                log.error(f"Worker {worker_id} failed on {token_address}: {e}")
+            results.put((worker_id, task_id, time.monotonic() - t0, ok,
+                         metrics.REGISTRY.drain() if own_process else None))
+            tasks.task_done()
+    finally:
+        if own_process:
+            BROWSER_POOL.close()
+
+
+class TraderEngine:
+    """
+    Spread tokens over `workers` threads (each leasing its own browser) or processes.
+    The task queue is bounded, so submit() blocks when the workers fall behind.
+    """
+
+    def __init__(self, workers: int = TRADER_WORKERS, mode: str = TRADER_WORKER_MODE,
+                 queue_size: int = TRADER_QUEUE_SIZE):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode: {mode}")
+        self.workers = max(1, workers)
+        self.mode = mode
+        if mode == "process":
+            self.tasks = mp.JoinableQueue(maxsize=queue_size)
+            self.results = mp.Queue()
+        else:
+            self.tasks = queue.Queue(maxsize=queue_size)
+            self.results = queue.Queue()
+        self.stats = {i: {"tokens": 0, "failed": 0, "busy_sec": 0.0} for i in range(self.workers)}
+        self.started_at = None
+        self._handles = []
+        self._stats_lock = threading.Lock()
+        self._next_task = 0
+        self._callbacks = {}   # task id -> on_done(ok), run on the collector thread
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for i in range(self.workers):
+            if self.mode == "process":
+                h = mp.Process(target=_worker_loop, args=(i, self.tasks, self.results, True), daemon=True)
+            else:
+                h = threading.Thread(target=_worker_loop, args=(i, self.tasks, self.results), daemon=True)
+            h.start()
+            self._handles.append(h)
+        threading.Thread(target=self._collect, daemon=True).start()
+        metrics.gauge("trader_queue_depth", "Tokens waiting for a worker", fn=self.tasks.qsize)
+        if TRADER_REPORT_SEC > 0:
+            threading.Thread(target=self._report_loop, daemon=True).start()
+        dprint(f"Trader engine started: {self.workers} {self.mode} worker(s), queue size {TRADER_QUEUE_SIZE}")
+
+    def submit(self, token_address: str, on_done=None):
+        """Queue a token (blocks while the queue is full); on_done(ok) runs once it is processed."""
+        with self._stats_lock:
+            self._next_task += 1
+            task_id = self._next_task
+            if on_done is not None:
+                self._callbacks[task_id] = on_done
+        self.tasks.put((task_id, token_address))
+
+    def join(self):
+        """Block until every submitted token has been processed."""
+        self.tasks.join()
+
+    def pids(self) -> List[int]:
+        """Worker process ids (empty in thread mode)."""
+        return [h.pid for h in self._handles if self.mode == "process" and h.pid]
+
+    def stop(self):
+        for _ in self._handles:
+            self.tasks.put(None)
+        for h in self._handles:
+            h.join()
+
+    def _collect(self):
+        while True:
+            worker_id, task_id, elapsed, ok, shipped = self.results.get()
+            if shipped:
+                metrics.REGISTRY.merge(shipped)
+            TOKENS.inc(result="ok" if ok else "failed")
+            with self._stats_lock:
+                st = self.stats[worker_id]
+                st["tokens"] += 1
+                st["busy_sec"] += elapsed
+                if not ok:
+                    st["failed"] += 1
+                on_done = self._callbacks.pop(task_id, None)
+            if on_done is not None:
+                try:
+                    on_done(ok)
+                except Exception as e:
+                    dprint(f"Completion callback failed for task {task_id}: {e}")
+
+    def _report_loop(self):
+        while True:
+            time.sleep(TRADER_REPORT_SEC)
+            self.report()
+
+    def report(self):
+        up_min = max(time.monotonic() - self.started_at, 1e-9) / 60
+        with self._stats_lock:
+            for i, st in self.stats.items():
+                avg = st["busy_sec"] / st["tokens"] if st["tokens"] else 0.0
+                dprint(f"worker {i}: {st['tokens']} tokens ({st['failed']} failed), "
+                       f"{st['tokens'] / up_min:.2f} tokens/min, {avg:.1f}s/token")
+            total = sum(st["tokens"] for st in self.stats.values())
+        dprint(f"engine: {total} tokens, {total / up_min:.2f} tokens/min, queue depth {self.tasks.qsize()}")
+        try:
+            cs = WALLET_CACHE.stats()
+            dprint(f"wallet cache: {cs['shared_hits']} hits / {cs['shared_misses']} misses "
+                   f"({cs['shared_hit_ratio']:.1%} hit ratio)")
+        except redis.RedisError as e:
+            log.error(f"Error reading wallet cache stats: {e}")
+
+
 if __name__ == "__main__":
     dprint("Starting trader-extractor-redis.py...")
 
@@ -287,49 +491,56 @@ if __name__ == "__main__":
     try:
         r.ping()
     except redis.ConnectionError:
-        dprint("Error connecting to Redis")
+        log.error("Error connecting to Redis")
         exit(1)
 
     # initialize the SQL connection
     try:
         sql_cursor.execute("CREATE DATABASE IF NOT EXISTS solana_tokens")
         sql_cursor.execute("USE solana_tokens")
-        sql_cursor.execute("""
-            CREATE TABLE IF NOT EXISTS traders (
-                wallet_address VARCHAR(44) PRIMARY KEY,
-                token_address VARCHAR(44),
-                gross_profit DECIMAL(20, 2),
-                realized_profit DECIMAL(20, 2),
-                realized_profit_percent DECIMAL(5, 2),
-                unrealized_profit DECIMAL(20, 2),
-                unrealized_profit_percent DECIMAL(5, 2),
-                win_rate DECIMAL(5, 2),
-                wins INT,
-                losses INT,
-                trade_volume DECIMAL(20, 2),
-                trades INT,
-                avg_trade_size DECIMAL(20, 2),
-                is_bot BOOLEAN      
-            )
-                    """)
         sqldb.commit()
+        # composite (wallet, token) key + indexes; migrates the old wallet-only key
+        ensure_schema(sqldb)
     except mysql.connector.Error as err:
-        dprint(f"Error initializing MySQL: {err}")
+        log.error(f"Error initializing MySQL: {err}")
         exit(1)
 
-    # get initial sync
+    # join the consumer group first; events published during the initial sync
+    # stay in the stream and are read afterwards
+    consumer = EventConsumer(r, EVENT_GROUP)
+
+    metrics.serve()   # METRICS_PORT
+    if TRADER_WORKER_MODE == "thread":
+        BROWSER_POOL.warm()
+
+    engine = TraderEngine()
+    # kill -USR1 <pid> profiles the next PROFILE_SIGNAL_CYCLES tokens; forwarded to worker processes
+    install_signal(forward_to=engine.pids)
+    engine.start()
+
+    checkpoints = Checkpoints()
+
+    # get initial sync (incremental mode skips tokens extracted within TRADER_STALE_SEC)
+    version = get_latest_version()
     snapshot = load_current_snapshot()
-    if snapshot:
-        for tok in snapshot:
-            _process_one_token(tok['contract'])
+    contracts = [tok['contract'] for tok in snapshot or []]
+    queued = submit_tokens(engine, checkpoints, contracts, version)
+    dprint(f"Initial sync ({TRADER_MODE}): {queued} of {len(contracts)} tokens need extraction")
+    engine.join()
+    engine.report()
     dprint("Initial sync complete")
+    last_scan = time.monotonic()
+
+    while True:
+        try:
+            entries = consumer.read(count=TRADER_QUEUE_SIZE)
+        except redis.RedisError as e:
+            log.error(f"Error reading {consumer.stream}: {e}")
+            time.sleep(1)
+            continue
 
-    # Subscribe to Redis channel for token changes
-    p = r.pubsub(ignore_subscribe_messages=True)
-    p.subscribe("token_changed")
-
-    for message in p.listen():
-            # payload = {
+        for entry_id, event in entries:
+            # event = {
             #     "event_id": f"{chain}:{contract}:{window_version}:{change_type}:{old_rank}:{new_rank}",
             #     "as_of": as_of.isoformat(),
             #     "change_type": change_type,
@@ -339,5 +550,21 @@ if __name__ == "__main__":
             #     "new_rank": new_rank,
             #     "window_version": window_version
             # }
-
-            dprint(f"Received message: {message}")
\ No newline at end of file
+            dprint(f"Received event {entry_id}: {event}")
+            if event.get("change_type") == "ADDED" and event.get("chain", CHAIN) == CHAIN:
+                # ack only once the token was extracted (by this or an already queued task,
+                # or recently); a failed one stays pending and is retried via XAUTOCLAIM
+                # (up to EVENT_MAX_DELIVERIES times)
+                done = lambda ok, eid=entry_id: consumer.ack(eid) if ok else consumer.release(eid)
+                submit_tokens(engine, checkpoints, [event["contract"]], event.get("window_version") or 0, on_done=done)
+            else:
+                consumer.ack(entry_id)
+
+        # tokens that stayed in the window long enough for their data to go stale
+        if TRADER_MODE == "incremental" and time.monotonic() - last_scan >= TRADER_STALE_SCAN_SEC:
+            last_scan = time.monotonic()
+            version = get_latest_version()
+            contracts = [tok['contract'] for tok in load_current_snapshot() or []]
+            queued = submit_tokens(engine, checkpoints, contracts, version)
+            if queued:
+                dprint(f"Stale sweep: queued {queued} of {len(contracts)} tokens")
@@ -0,0 +1,129 @@
+# trader_store.py
+# Persistence for the traders table: one row per (wallet, token), buffered per token
+# and written with a single multi-row upsert.
+from typing import Dict, List, Tuple
+from metrics import get_logger
+
+log = get_logger("store")
+
+# rows the primary-key migration cannot keep (no token_address) are moved here, not deleted
+ORPHANS_TABLE = "traders_without_token"
+
+TRADERS_DDL = """
+    CREATE TABLE IF NOT EXISTS traders (
+        wallet_address VARCHAR(44) NOT NULL,
+        token_address VARCHAR(44) NOT NULL,
+        gross_profit DECIMAL(20, 2),
+        realized_profit DECIMAL(20, 2),
+        realized_profit_percent DECIMAL(5, 2),
+        unrealized_profit DECIMAL(20, 2),
+        unrealized_profit_percent DECIMAL(5, 2),
+        win_rate DECIMAL(5, 2),
+        wins INT,
+        losses INT,
+        trade_volume DECIMAL(20, 2),
+        trades INT,
+        avg_trade_size DECIMAL(20, 2),
+        is_bot BOOLEAN,
+        PRIMARY KEY (wallet_address, token_address),
+        INDEX idx_traders_win_rate (win_rate),
+        INDEX idx_traders_gross_profit (gross_profit),
+        INDEX idx_traders_trades (trades),
+        INDEX idx_traders_avg_trade_size (avg_trade_size)
+    )
+"""
+
+# secondary indexes for the filters used in aiven_viewer.py
+TRADER_INDEXES = {
+    "idx_traders_win_rate": "win_rate",
+    "idx_traders_gross_profit": "gross_profit",
+    "idx_traders_trades": "trades",
+    "idx_traders_avg_trade_size": "avg_trade_size",
+}
+
+TRADER_COLUMNS = (
+    "gross_profit", "realized_profit", "realized_profit_percent", "unrealized_profit",
+    "unrealized_profit_percent", "win_rate", "wins", "losses", "trade_volume", "trades",
+    "avg_trade_size", "is_bot",
+)
+
+UPSERT_TRADERS_SQL = (
+    "INSERT INTO traders (wallet_address, token_address, " + ", ".join(TRADER_COLUMNS) + ") "
+    "VALUES (" + ", ".join(["%s"] * (len(TRADER_COLUMNS) + 2)) + ") "
+    "ON DUPLICATE KEY UPDATE " + ", ".join(f"{c}=VALUES({c})" for c in TRADER_COLUMNS)
+)
+
+
+def ensure_schema(conn):
+    """
+    Create the traders table, or migrate one created with the old
+    wallet-only primary key, and add any missing secondary indexes.
+    Rows without a token_address cannot be part of the new key; they are moved
+    to ORPHANS_TABLE (and counted in the log) before the key changes.
+    """
+    cur = conn.cursor()
+    cur.execute(TRADERS_DDL)
+
+    cur.execute("""
+        SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'traders' AND CONSTRAINT_NAME = 'PRIMARY'
+        ORDER BY ORDINAL_POSITION
+    """)
+    pk = [row[0] for row in cur.fetchall()]
+    if pk != ["wallet_address", "token_address"]:
+        cur.execute("SELECT COUNT(*) FROM traders WHERE token_address IS NULL")
+        orphans = cur.fetchone()[0]
+        if orphans:
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {ORPHANS_TABLE} LIKE traders")
+            cur.execute(f"INSERT IGNORE INTO {ORPHANS_TABLE} SELECT * FROM traders WHERE token_address IS NULL")
+            cur.execute("DELETE FROM traders WHERE token_address IS NULL")
+            log.warning(f"traders migration: moved {orphans} row(s) without a token_address to {ORPHANS_TABLE}; "
+                        f"review them there, then drop the table")
+        cur.execute("""
+            ALTER TABLE traders
+                MODIFY token_address VARCHAR(44) NOT NULL,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (wallet_address, token_address)
+        """)
+
+    cur.execute("""
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'traders'
+    """)
+    existing = {row[0] for row in cur.fetchall()}
+    for name, column in TRADER_INDEXES.items():
+        if name not in existing:
+            cur.execute(f"CREATE INDEX {name} ON traders ({column})")
+
+    conn.commit()
+    cur.close()
+
+
+class TraderBuffer:
+    """Collects the wallets scraped for one token and upserts them in one statement."""
+
+    def __init__(self, token_address: str):
+        self.token_address = token_address
+        self.rows: List[Tuple] = []
+
+    def add(self, wallet_address: str, metrics: Dict):
+        self.rows.append(
+            (wallet_address, self.token_address) + tuple(metrics.get(c) for c in TRADER_COLUMNS)
+        )
+
+    def flush(self, conn) -> int:
+        """Write buffered rows in one transaction; returns the number of rows written."""
+        if not self.rows:
+            return 0
+        cur = conn.cursor()
+        try:
+            cur.executemany(UPSERT_TRADERS_SQL, self.rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+        n = len(self.rows)
+        self.rows = []
+        return n
@@ -0,0 +1,82 @@
+# wallet_cache.py
+# Redis-backed cache of dexcheck wallet-analyzer metrics, keyed by wallet address,
+# so a wallet seen under several trending tokens is only scraped once per TTL.
+import os, json, time, threading
+from typing import Dict, Optional
+
+WALLET_CACHE_TTL_SEC = int(os.getenv("WALLET_CACHE_TTL_SEC", "21600"))     # 6h
+WALLET_CACHE_MAX_ENTRIES = int(os.getenv("WALLET_CACHE_MAX_ENTRIES", "50000"))
+
+# redis keys
+K_WALLET = "wallet:metrics:{wallet}"      # json, expires after TTL
+K_WALLET_INDEX = "wallet:metrics:index"   # zset wallet -> stored-at (for eviction)
+K_WALLET_STATS = "wallet:metrics:stats"   # hash hits / misses (shared by all workers)
+
+
+class WalletCache:
+    def __init__(self, r, ttl: int = WALLET_CACHE_TTL_SEC, max_entries: int = WALLET_CACHE_MAX_ENTRIES):
+        self.r = r
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, field: str):
+        with self._lock:
+            if field == "hits": self.hits += 1
+            else: self.misses += 1
+        try:
+            self.r.hincrby(K_WALLET_STATS, field, 1)
+        except Exception:
+            pass
+
+    def get(self, wallet: str) -> Optional[Dict]:
+        """Return cached metrics for a wallet, or None if absent/expired."""
+        if self.ttl <= 0:
+            return None
+        raw = self.r.get(K_WALLET.format(wallet=wallet))
+        if raw:
+            try:
+                metrics = json.loads(raw)
+                self._count("hits")
+                return metrics
+            except ValueError:
+                pass
+        self._count("misses")
+        return None
+
+    def put(self, wallet: str, metrics: Dict):
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        pipe = self.r.pipeline()
+        pipe.set(K_WALLET.format(wallet=wallet), json.dumps(metrics), ex=self.ttl)
+        pipe.zadd(K_WALLET_INDEX, {wallet: now})
+        # index entries whose key has already expired
+        pipe.zremrangebyscore(K_WALLET_INDEX, "-inf", now - self.ttl)
+        pipe.zcard(K_WALLET_INDEX)
+        size = pipe.execute()[-1]
+        if size > self.max_entries:
+            self._evict(size - self.max_entries)
+
+    def _evict(self, n: int):
+        """Drop the n oldest wallets."""
+        oldest = self.r.zpopmin(K_WALLET_INDEX, n)
+        if oldest:
+            self.r.delete(*[K_WALLET.format(wallet=w) for w, _ in oldest])
+
+    def stats(self) -> Dict:
+        """Local (this process) and shared (all workers) hit/miss counters."""
+        shared = self.r.hgetall(K_WALLET_STATS) or {}
+        s_hits, s_misses = int(shared.get("hits", 0)), int(shared.get("misses", 0))
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "shared_hits": s_hits,
+            "shared_misses": s_misses,
+            "shared_hit_ratio": s_hits / (s_hits + s_misses) if s_hits + s_misses else 0.0,
+        }